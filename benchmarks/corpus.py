@@ -0,0 +1,230 @@
+# benchmarks/corpus.py
+"""
+Generador de un corpus sintético y determinista para los benchmarks: un documento
+por formato soportado (EXTRACTORES) y por tamaño. El contenido depende solo de la
+semilla, así que dos ejecuciones producen el mismo texto.
+
+Uso:
+    python benchmarks/corpus.py --salida corpus_bench --tamanos pequeno mediano
+"""
+import argparse
+import csv
+import io
+import json
+import random
+import sys
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from parser_core import EXTRACTORES  # noqa: E402
+
+# Multiplicador de unidades (páginas, párrafos, filas...) de cada tamaño
+TAMANOS = {"pequeno": 1, "mediano": 10, "grande": 50}
+
+# Unidades de un documento "pequeño" de cada formato
+UNIDADES_BASE = {
+    '.pdf': 4, '.docx': 40, '.txt': 400, '.html': 40, '.xml': 400, '.pptx': 4,
+    '.xlsx': 400, '.odt': 40, '.rtf': 40, '.epub': 2, '.md': 40, '.json': 200, '.csv': 400,
+}
+
+_PALABRAS = (
+    "el la de que y en un una los las por con para como más pero sus datos modelo texto "
+    "documento análisis procesamiento lenguaje corpus sistema resultado capítulo sección "
+    "información contrato cláusula parte acuerdo manual usuario proceso archivo página"
+).split()
+
+
+class _Texto:
+    """Fuente de líneas pseudoaleatorias con la mezcla de ruido y estructura que limpia el parser."""
+
+    def __init__(self, semilla):
+        self.rnd = random.Random(semilla)
+
+    def frase(self, minimo=6, maximo=18):
+        palabras = [self.rnd.choice(_PALABRAS) for _ in range(self.rnd.randint(minimo, maximo))]
+        return " ".join(palabras).capitalize() + "."
+
+    def titulo(self):
+        return " ".join(self.rnd.choice(_PALABRAS) for _ in range(self.rnd.randint(2, 5))).upper()
+
+    def linea(self):
+        tirada = self.rnd.random()
+        if tirada < 0.05:
+            return self.titulo()
+        if tirada < 0.12:
+            return f"- {self.frase(3, 8)}"
+        if tirada < 0.15:
+            return f">>> print('{self.rnd.choice(_PALABRAS)}')"
+        if tirada < 0.18:
+            return self.rnd.choice(("Copyright 2025", "Todos los derechos reservados", str(self.rnd.randint(1, 999))))
+        return self.frase()
+
+    def lineas(self, n):
+        return [self.linea() for _ in range(n)]
+
+
+# --- Generadores por formato (devuelven bytes) ---
+
+def _pdf(t, n):
+    # PDF mínimo escrito a mano (sin dependencias): n páginas de 40 líneas
+    objetos = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    hijos = []
+    for i in range(n):
+        id_pagina = 4 + 2 * i
+        hijos.append(f"{id_pagina} 0 R")
+        lineas = [l.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for l in t.lineas(40)]
+        contenido = ("BT /F1 10 Tf 50 780 Td 14 TL " + " ".join(f"({l}) Tj T*" for l in lineas) + " ET")
+        datos = contenido.encode('cp1252', errors='replace')
+        objetos.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {id_pagina + 1} 0 R >>".encode())
+        objetos.append(b"<< /Length %d >>\nstream\n" % len(datos) + datos + b"\nendstream")
+    objetos[1] = f"<< /Type /Pages /Kids [{' '.join(hijos)}] /Count {n} >>".encode()
+    salida = bytearray(b"%PDF-1.4\n")
+    posiciones = []
+    for i, obj in enumerate(objetos):
+        posiciones.append(len(salida))
+        salida += b"%d 0 obj\n" % (i + 1) + obj + b"\nendobj\n"
+    inicio_xref = len(salida)
+    salida += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    for pos in posiciones:
+        salida += b"%010d 00000 n \n" % pos
+    salida += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objetos) + 1, inicio_xref)
+    return bytes(salida)
+
+def _docx(t, n):
+    import docx
+    doc = docx.Document()
+    for linea in t.lineas(n):
+        doc.add_paragraph(linea)
+    return _guardar(doc.save)
+
+def _txt(t, n):
+    return "\n".join(t.lineas(n)).encode('utf-8')
+
+def _html(t, n):
+    cuerpo = "".join(f"<h2>{t.titulo()}</h2><p>{escape(t.frase())}</p><ul><li>{escape(t.frase(3, 6))}</li></ul>"
+                     for _ in range(n))
+    return (f"<html><head><style>p {{ margin: 0 }}</style><script>var x = 1;</script></head>"
+            f"<body>{cuerpo}</body></html>").encode('utf-8')
+
+def _xml(t, n):
+    registros = "".join(f"<registro id='{i}'><titulo>{escape(t.titulo())}</titulo>"
+                        f"<texto>{escape(t.frase())}</texto></registro>" for i in range(n))
+    return f"<?xml version='1.0' encoding='utf-8'?><corpus>{registros}</corpus>".encode('utf-8')
+
+def _pptx(t, n):
+    import pptx
+    prs = pptx.Presentation()
+    for _ in range(n):
+        diapositiva = prs.slides.add_slide(prs.slide_layouts[1])
+        diapositiva.shapes.title.text = t.titulo()
+        diapositiva.placeholders[1].text = "\n".join(t.lineas(8))
+    return _guardar(prs.save)
+
+def _xlsx(t, n):
+    import openpyxl
+    libro = openpyxl.Workbook(write_only=True)
+    for hoja in range(2):
+        ws = libro.create_sheet(f"Hoja{hoja + 1}")
+        for i in range(n // 2):
+            ws.append([i, t.frase(2, 5), round(t.rnd.random() * 1000, 2), None, t.rnd.choice(_PALABRAS)])
+    return _guardar(libro.save)
+
+def _odt(t, n):
+    from odf.opendocument import OpenDocumentText
+    from odf.text import P
+    doc = OpenDocumentText()
+    for linea in t.lineas(n):
+        doc.text.addElement(P(text=linea))
+    return _guardar(doc.save)
+
+def _rtf(t, n):
+    def rtf(linea):
+        return "".join(c if ord(c) < 128 else f"\\'{ord(c.encode('cp1252', 'replace')):02x}" for c in linea)
+    cuerpo = "".join(f"{rtf(l)}\\par\n" for l in t.lineas(n))
+    return ("{\\rtf1\\ansi\\deff0 {\\fonttbl {\\f0 Helvetica;}}\n" + cuerpo + "}").encode('ascii')
+
+def _epub(t, n):
+    from ebooklib import epub
+    libro = epub.EpubBook()
+    libro.set_identifier("bench"); libro.set_title("Corpus"); libro.set_language("es")
+    capitulos = []
+    for i in range(n):
+        capitulo = epub.EpubHtml(title=f"Capítulo {i}", file_name=f"cap{i}.xhtml", lang="es")
+        parrafos = "".join(f"<p>{escape(l)}</p>" for l in t.lineas(200))
+        capitulo.content = f"<h1>{t.titulo()}</h1>{parrafos}"
+        libro.add_item(capitulo); capitulos.append(capitulo)
+    libro.toc = capitulos
+    libro.spine = ["nav"] + capitulos
+    libro.add_item(epub.EpubNcx()); libro.add_item(epub.EpubNav())
+    return _guardar(lambda f: epub.write_epub(f, libro))
+
+def _md(t, n):
+    bloques = []
+    for _ in range(n):
+        bloques.append(f"## {t.titulo().title()}\n\n{t.frase()} **{t.rnd.choice(_PALABRAS)}** {t.frase()}\n\n"
+                       f"- {t.frase(3, 6)}\n- {t.frase(3, 6)}\n\n```\n>>> print('hola')\n```\n")
+    return "\n".join(bloques).encode('utf-8')
+
+def _json(t, n):
+    datos = [{"id": i, "titulo": t.titulo(), "texto": t.frase(), "valor": round(t.rnd.random(), 4),
+              "etiquetas": [t.rnd.choice(_PALABRAS) for _ in range(3)], "activo": i % 2 == 0}
+             for i in range(n)]
+    return json.dumps(datos, ensure_ascii=False).encode('utf-8')
+
+def _csv(t, n):
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(["id", "texto", "valor", "categoria"])
+    for i in range(n):
+        escritor.writerow([i, t.frase(3, 10), round(t.rnd.random() * 100, 2), t.rnd.choice(_PALABRAS)])
+    return salida.getvalue().encode('utf-8')
+
+def _guardar(funcion_guardar):
+    buffer = io.BytesIO()
+    funcion_guardar(buffer)
+    return buffer.getvalue()
+
+
+GENERADORES = {
+    '.pdf': _pdf, '.docx': _docx, '.txt': _txt, '.html': _html, '.xml': _xml, '.pptx': _pptx,
+    '.xlsx': _xlsx, '.odt': _odt, '.rtf': _rtf, '.epub': _epub, '.md': _md, '.json': _json, '.csv': _csv,
+}
+
+
+def generar_documento(extension, tamano, semilla=0) -> bytes:
+    """Genera los bytes de un documento sintético del formato y tamaño indicados."""
+    unidades = UNIDADES_BASE[extension] * TAMANOS[tamano]
+    return GENERADORES[extension](_Texto(f"{semilla}{extension}{tamano}"), unidades)
+
+
+def generar_corpus(directorio, tamanos=tuple(TAMANOS), formatos=None, semilla=0):
+    """
+    Escribe el corpus en el directorio (<tamano>/<tamano><extension>) y devuelve la
+    lista de (extension, tamano, ruta). Los documentos ya existentes se reutilizan.
+    """
+    directorio = Path(directorio)
+    documentos = []
+    for extension in formatos or sorted(EXTRACTORES):
+        if extension not in GENERADORES:
+            continue
+        for tamano in tamanos:
+            ruta = directorio / tamano / f"{tamano}{extension}"
+            if not ruta.exists():
+                ruta.parent.mkdir(parents=True, exist_ok=True)
+                ruta.write_bytes(generar_documento(extension, tamano, semilla))
+            documentos.append((extension, tamano, ruta))
+    return documentos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera el corpus sintético de los benchmarks.")
+    parser.add_argument("--salida", default="corpus_bench", help="Directorio de salida")
+    parser.add_argument("--tamanos", nargs="+", choices=list(TAMANOS), default=list(TAMANOS))
+    parser.add_argument("--formatos", nargs="+", help="Extensiones a generar (p. ej. .pdf .xlsx)")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+    for extension, tamano, ruta in generar_corpus(args.salida, args.tamanos, args.formatos, args.semilla):
+        print(f"{extension:6} {tamano:8} {ruta.stat().st_size:>12,} B  {ruta}")
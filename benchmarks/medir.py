@@ -0,0 +1,246 @@
+# benchmarks/medir.py
+"""
+Benchmarks de extracción y limpieza por formato y tamaño.
+
+Para cada documento del corpus sintético (ver corpus.py) mide por separado:
+  - extracción: tiempo, unidades/s (páginas, filas, capítulos...), MB/s y pico de memoria
+  - limpieza: tiempo, MB/s y pico de memoria de limpiar_y_estructurar_texto
+
+Los resultados se escriben en JSON y pueden compararse con una línea base guardada;
+si alguna métrica empeora más que el umbral configurado, el proceso termina con código 1.
+
+Con --verificar, además, se comprueba que los dos motores de extracción de marcado
+(lxml y bs4) producen exactamente el mismo texto en los formatos que los admiten.
+
+Uso:
+    python benchmarks/medir.py --salida bench.json
+    python benchmarks/medir.py --comparar benchmarks/baseline.json --umbral-tiempo 0.20
+    python benchmarks/medir.py --verificar --formatos .html .xml .md .epub
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+import parser_core  # noqa: E402
+from corpus import TAMANOS, generar_corpus  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def _medir_tiempo(funcion, repeticiones):
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos), resultado
+
+
+def _medir_memoria(funcion):
+    tracemalloc.start()
+    try:
+        funcion()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def medir_documento(ruta, repeticiones=3, **opciones):
+    """Mide extracción y limpieza de un documento y devuelve un diccionario de métricas."""
+    tamano_bytes = ruta.stat().st_size
+
+    def extraer():
+        return list(parser_core.extraer_texto_stream(ruta, **opciones))
+
+    extraer()  # Calentamiento: la primera ejecución incluye la importación perezosa del backend
+    segundos_extraccion, unidades = _medir_tiempo(extraer, repeticiones)
+    texto_bruto = "\n".join(unidades)
+    memoria_extraccion = _medir_memoria(extraer)
+
+    def limpiar():
+        return parser_core.limpiar_y_estructurar_texto(texto_bruto)
+
+    segundos_limpieza, texto_limpio = _medir_tiempo(limpiar, repeticiones)
+    memoria_limpieza = _medir_memoria(limpiar)
+    mb_bruto = len(texto_bruto.encode('utf-8')) / MB
+
+    return {
+        "bytes_archivo": tamano_bytes,
+        "unidades": len(unidades),
+        "caracteres_bruto": len(texto_bruto),
+        "caracteres_limpio": len(texto_limpio),
+        "extraccion_s": round(segundos_extraccion, 6),
+        "extraccion_unidades_s": round(len(unidades) / segundos_extraccion, 2) if segundos_extraccion else None,
+        "extraccion_mb_s": round(tamano_bytes / MB / segundos_extraccion, 3) if segundos_extraccion else None,
+        "extraccion_pico_memoria_bytes": memoria_extraccion,
+        "limpieza_s": round(segundos_limpieza, 6),
+        "limpieza_mb_s": round(mb_bruto / segundos_limpieza, 3) if segundos_limpieza else None,
+        "limpieza_pico_memoria_bytes": memoria_limpieza,
+    }
+
+
+def ejecutar(directorio_corpus, tamanos, formatos=None, repeticiones=3, **opciones):
+    resultados = {}
+    for extension, tamano, ruta in generar_corpus(directorio_corpus, tamanos, formatos):
+        clave = f"{extension.lstrip('.')}/{tamano}"
+        resultados[clave] = medir_documento(ruta, repeticiones, **opciones)
+        r = resultados[clave]
+        print(f"{clave:18} extracción {r['extraccion_s']:9.4f}s {r['extraccion_mb_s'] or 0:9.2f} MB/s "
+              f"pico {r['extraccion_pico_memoria_bytes'] / MB:8.2f} MB | limpieza {r['limpieza_s']:8.4f}s "
+              f"{r['limpieza_mb_s'] or 0:8.2f} MB/s", flush=True)
+    return {
+        "meta": {
+            "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "version_extraccion": parser_core.VERSION_EXTRACCION,
+            "version_limpieza": parser_core.VERSION_LIMPIEZA,
+            "repeticiones": repeticiones,
+        },
+        "resultados": resultados,
+    }
+
+
+def verificar_motores(directorio_corpus, tamanos, formatos=None):
+    """Devuelve la lista de documentos cuyo texto difiere entre los motores lxml y bs4."""
+    formatos = [f for f in (formatos or parser_core.MOTOR_MARCADO_POR_DEFECTO)
+                if f in parser_core.MOTOR_MARCADO_POR_DEFECTO]
+    diferencias = []
+    for extension, tamano, ruta in generar_corpus(directorio_corpus, tamanos, formatos):
+        textos = {motor: parser_core.extraer_texto(ruta, motor=motor) for motor in parser_core.MOTORES_MARCADO}
+        if len(set(textos.values())) > 1:
+            diferencias.append(f"{extension.lstrip('.')}/{tamano}")
+    for nombre, extension, contenido, iguales in CASOS_MOTORES:
+        if formatos and extension not in formatos:
+            continue
+        textos = {motor: parser_core.extraer_texto(contenido.encode('utf-8'), nombre_archivo=f"caso{extension}",
+                                                   motor=motor) for motor in parser_core.MOTORES_MARCADO}
+        if iguales and len(set(textos.values())) > 1:
+            diferencias.append(f"caso {nombre}")
+    return diferencias
+
+# Casos límite de entidades y caracteres especiales: (nombre, extensión, contenido, deben coincidir).
+# Con un DTD interno, BeautifulSoup (lxml-xml) pierde todo el documento y lxml sustituye las
+# entidades: es una diferencia conocida (el motor forma parte de la clave de caché)
+CASOS_MOTORES = (
+    ("xml-entidades-predefinidas", ".xml", '<r><a>x &amp; y &lt;z&gt; &#233;&#x41;</a><b>&quot;c&apos;</b></r>', True),
+    ("xml-cdata", ".xml", '<r><a><![CDATA[uno <dos> & tres]]></a> cola</r>', True),
+    ("xml-dtd-interno", ".xml",
+     '<?xml version="1.0"?><!DOCTYPE r [<!ENTITY e "entidad">]><r><a>x &e; y</a></r>', False),
+    ("html-entidades", ".html", '<p>a &amp; b &copy; &nbsp;c &eacute;&#8364;</p><script>x &lt; 1</script>', True),
+    ("html-entidad-desconocida", ".html", '<p>a &noexiste; b &amp c</p>', True),
+)
+
+
+def verificar_secciones_markdown(tamano_bloque=16):
+    """
+    Devuelve los casos de CASOS_SECCIONES_MARKDOWN cuyo texto cambia al convertir el
+    Markdown por secciones (forzadas con un tamaño de bloque diminuto) en lugar de entero.
+    """
+    diferencias = []
+    original = parser_core.TAMANO_BLOQUE_TEXTO
+    for nombre, contenido in CASOS_SECCIONES_MARKDOWN:
+        for motor in parser_core.MOTORES_MARCADO:
+            datos = contenido.encode('utf-8')
+            try:
+                entero = parser_core.extraer_texto(datos, nombre_archivo="caso.md", motor=motor)
+                parser_core.TAMANO_BLOQUE_TEXTO = tamano_bloque
+                por_secciones = parser_core.extraer_texto(datos, nombre_archivo="caso.md", motor=motor)
+            finally:
+                parser_core.TAMANO_BLOQUE_TEXTO = original
+            if entero != por_secciones:
+                diferencias.append(f"caso {nombre} ({motor})")
+    return diferencias
+
+# Markdown que el troceo por secciones no debe alterar: (nombre, contenido)
+CASOS_SECCIONES_MARKDOWN = (
+    ("titulos-y-parrafos", "# Uno\n\npárrafo uno\n\n## Dos\n\npárrafo dos\n\n### Tres\n\nfin\n"),
+    ("html-tras-blanco", "texto previo\n\n<div>\nhtml\n\nsigue</div>\n\nDespués del bloque\n"),
+    ("html-tras-separador", "***\n<div>\nhtml\n\nstill</div>\n\nDespués del bloque\n"),
+    ("html-tras-parrafo", "un párrafo\n<section>\nuno\n\ndos\n</section>\n\nfin del documento\n"),
+    ("referencias", "Ver [enlace][r] al final.\n\nOtro párrafo largo\n\n[r]: https://example.com\n"),
+)
+
+
+# Métricas comparadas con la línea base: (nombre, tipo de umbral). En todas, más es peor.
+METRICAS_COMPARADAS = (
+    ("extraccion_s", "tiempo"), ("limpieza_s", "tiempo"),
+    ("extraccion_pico_memoria_bytes", "memoria"), ("limpieza_pico_memoria_bytes", "memoria"),
+)
+
+
+def comparar(actual, base, umbral_tiempo, umbral_memoria):
+    """Devuelve la lista de regresiones (texto) de actual frente a la línea base."""
+    umbrales = {"tiempo": umbral_tiempo, "memoria": umbral_memoria}
+    regresiones = []
+    for clave, metricas in actual["resultados"].items():
+        previas = base.get("resultados", {}).get(clave)
+        if not previas:
+            continue
+        for metrica, tipo in METRICAS_COMPARADAS:
+            antes, ahora = previas.get(metrica), metricas.get(metrica)
+            if not antes or ahora is None:
+                continue
+            variacion = (ahora - antes) / antes
+            if variacion > umbrales[tipo]:
+                regresiones.append(f"{clave} {metrica}: {antes} -> {ahora} (+{variacion:.0%}, "
+                                   f"umbral {umbrales[tipo]:.0%})")
+    return regresiones
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de extracción y limpieza por formato.")
+    parser.add_argument("--corpus", default="corpus_bench", help="Directorio del corpus (se genera si falta)")
+    parser.add_argument("--tamanos", nargs="+", choices=list(TAMANOS), default=["pequeno", "mediano"])
+    parser.add_argument("--formatos", nargs="+", help="Extensiones a medir (p. ej. .pdf .xlsx)")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--procesos", type=int, default=1,
+                        help="Procesos para la extracción de PDF (1 = en serie, resultados más estables)")
+    parser.add_argument("--salida", default="bench_output.json", help="Archivo JSON de resultados")
+    parser.add_argument("--comparar", help="JSON de línea base con el que comparar")
+    parser.add_argument("--umbral-tiempo", type=float, default=0.25,
+                        help="Empeoramiento relativo de tiempo tolerado (0.25 = 25 %%)")
+    parser.add_argument("--motor", choices=["lxml", "bs4"],
+                        help="Motor de extracción de HTML/XML/Markdown/EPUB (por defecto, el de cada formato)")
+    parser.add_argument("--verificar", action="store_true",
+                        help="Comprueba que los motores lxml y bs4 producen el mismo texto y que el "
+                             "Markdown por secciones coincide con el convertido entero")
+    parser.add_argument("--umbral-memoria", type=float, default=0.25,
+                        help="Empeoramiento relativo de pico de memoria tolerado")
+    args = parser.parse_args()
+
+    if args.verificar:
+        diferencias = verificar_motores(args.corpus, args.tamanos, args.formatos)
+        for diferencia in diferencias:
+            print(f"DIFERENCIA lxml/bs4 en {diferencia}")
+        secciones = verificar_secciones_markdown()
+        for diferencia in secciones:
+            print(f"DIFERENCIA Markdown por secciones/entero en {diferencia}")
+        if diferencias or secciones:
+            sys.exit(1)
+        print("Los motores lxml y bs4 producen el mismo texto (salvo las diferencias conocidas de CASOS_MOTORES).")
+        print("El Markdown convertido por secciones coincide con el convertido entero.")
+
+    opciones = {"procesos": args.procesos}
+    if args.motor:
+        opciones["motor"] = args.motor
+    informe = ejecutar(args.corpus, args.tamanos, args.formatos, args.repeticiones, **opciones)
+    Path(args.salida).write_text(json.dumps(informe, indent=2, ensure_ascii=False), encoding='utf-8')
+    print(f"Resultados guardados en {args.salida}")
+
+    if args.comparar:
+        base = json.loads(Path(args.comparar).read_text(encoding='utf-8'))
+        regresiones = comparar(informe, base, args.umbral_tiempo, args.umbral_memoria)
+        for regresion in regresiones:
+            print(f"REGRESIÓN {regresion}")
+        if regresiones:
+            sys.exit(1)
+        print("Sin regresiones respecto a la línea base.")
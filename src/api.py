@@ -1,70 +1,539 @@
 # src/api.py
 import os
-from pathlib import Path
-from flask import Flask, request, jsonify
+import json
+import time
+import tempfile
+import zlib
+import itertools
+import functools
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Flask, Request, Response, request, jsonify, stream_with_context
 from werkzeug.utils import secure_filename
 
 # CORRECCIÓN: Se añade un punto para el import relativo
-from .parser_core import (EXTRACTORES, extraer_texto, limpiar_y_estructurar_texto)
+from .parser_core import (EXTRACTORES, procesar_documento, procesar_documento_aislado, procesar_documento_stream,
+                          precargar_extractores, LimiteRecursosExcedido, FORMATOS_POR_PARTES,
+                          trocear_documento, trocear_texto, TAMANO_TROZO, estimar_coste,
+                          procesar_documento_en_pool, iniciar_proceso_pool, CALIDADES_PDF, analizar_rango_paginas)
+from .cache import CacheResultados
+from .planificador import Planificador, PROCESOS
+from .trabajos import GestorTrabajos, COMPLETADO, ERROR, CANCELADO, TERMINADOS
+from .metricas import RegistroMetricas, ejecutar_perfilada, perfilar_si_lenta
+
+# Los archivos subidos se mantienen en memoria hasta este tamaño; por encima pasan a
+# un temporal anónimo en disco (único por petición y borrado automáticamente)
+UMBRAL_SPOOL_BYTES = int(os.environ.get("PARSER_SPOOL_BYTES", 16 * 1024 * 1024))
+
+class PeticionSpool(Request):
+    """Petición cuyos archivos se reciben en un SpooledTemporaryFile con umbral configurable."""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UMBRAL_SPOOL_BYTES, mode='rb+')
 
 # Inicializamos la aplicación Flask
 app = Flask(__name__)
+app.request_class = PeticionSpool
+
+# Con PARSER_PRECARGAR=1 todas las librerías de extracción se importan al cargar la API,
+# de modo que con gunicorn --preload los workers las heredan ya cargadas tras el fork
+if os.environ.get("PARSER_PRECARGAR") == "1":
+    precargar_extractores()
+
+# Caché de resultados compartida por todas las peticiones (memoria + disco)
+cache_resultados = CacheResultados(directorio=os.environ.get("PARSER_CACHE_DIR", "./cache_resultados"))
+
+# Texto de cada parte (capítulo, diapositiva, hoja...) de los EPUB, DOCX, PPTX y XLSX: al
+# recibir una versión nueva de un documento solo se extraen de nuevo las partes modificadas
+cache_partes = CacheResultados(directorio=os.environ.get("PARSER_CACHE_PARTES_DIR", "./cache_partes"),
+                               max_entradas_memoria=1024)
+
+# Trabajos asíncronos para documentos largos: se procesan en segundo plano y el cliente
+# consulta su progreso; los resultados se conservan PARSER_TRABAJOS_TTL segundos
+gestor_trabajos = GestorTrabajos(
+    max_hilos=int(os.environ.get("PARSER_TRABAJOS_HILOS", 2)),
+    ttl_segundos=int(os.environ.get("PARSER_TRABAJOS_TTL", 3600)),
+    directorio=os.environ.get("PARSER_TRABAJOS_DIR", "./trabajos"),
+)
 
-# Creamos una carpeta temporal para guardar los archivos que se suban
-UPLOAD_FOLDER = Path("./temp_uploads")
-UPLOAD_FOLDER.mkdir(exist_ok=True)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Métricas por etapa expuestas en /metrics. PARSER_METRICAS_MEMORIA=1 añade el pico de
+# memoria de cada etapa (usa tracemalloc, que ralentiza el procesamiento)
+registro_metricas = RegistroMetricas(medir_memoria=os.environ.get("PARSER_METRICAS_MEMORIA") == "1")
+for _contador in ("aciertos_memoria", "aciertos_disco", "fallos", "bytes_disco"):
+    registro_metricas.registrar_indicador(f"cache_{_contador}", f"Caché de resultados: {_contador}",
+                                          lambda c=_contador: cache_resultados.estadisticas()[c])
+
+# Con PARSER_PERFIL_UMBRAL (segundos) el procesamiento de cada petición a /procesar se perfila
+# con cProfile allí donde se ejecuta (hilo de la petición o carril del planificador) y, si
+# tarda más que el umbral, el perfil se guarda en PARSER_PERFIL_DIR. Con ejecución aislada
+# el trabajo ocurre en un proceso hijo y no se perfila
+UMBRAL_PERFIL_S = float(os.environ["PARSER_PERFIL_UMBRAL"]) if os.environ.get("PARSER_PERFIL_UMBRAL") else None
+DIRECTORIO_PERFILES = os.environ.get("PARSER_PERFIL_DIR", "./perfiles")
+
+# Con PARSER_AISLADO=1 cada documento se procesa en un proceso hijo que se termina si
+# supera PARSER_TIMEOUT_S segundos o PARSER_MEMORIA_MAX_MB megabytes: un documento
+# patológico devuelve un error y el worker de la API sigue atendiendo peticiones
+EJECUCION_AISLADA = os.environ.get("PARSER_AISLADO") == "1"
+TIMEOUT_S = float(os.environ["PARSER_TIMEOUT_S"]) if os.environ.get("PARSER_TIMEOUT_S") else None
+MEMORIA_MAX_MB = float(os.environ["PARSER_MEMORIA_MAX_MB"]) if os.environ.get("PARSER_MEMORIA_MAX_MB") else None
+
+# Planificación por coste: cada documento se procesa en línea, en un pool de hilos o en
+# un pool de procesos según su formato, tamaño y páginas (parser_core.estimar_coste),
+# para que los pequeños no esperen detrás de un PDF de cientos de páginas. Cada carril
+# tiene su límite de documentos simultáneos; PARSER_PLANIFICADOR=0 lo procesa todo en
+# el hilo de la petición. No se aplica con ejecución aislada ni a /trabajos, que ya se
+# ejecutan fuera de la petición e informan del progreso página a página
+PLANIFICACION = os.environ.get("PARSER_PLANIFICADOR", "1") == "1" and not EJECUCION_AISLADA
+planificador = Planificador(
+    max_en_linea=int(os.environ.get("PARSER_EN_LINEA_MAX", 4)),
+    max_hilos=int(os.environ.get("PARSER_HILOS_MAX", 4)),
+    max_procesos=int(os.environ.get("PARSER_PROCESOS_MAX", min(4, os.cpu_count() or 1))),
+    segundos_en_linea=float(os.environ.get("PARSER_SEGUNDOS_EN_LINEA", 0.05)),
+    segundos_procesos=float(os.environ.get("PARSER_SEGUNDOS_PROCESOS", 0.5)),
+    # Los procesos del pool comparten con la API el directorio de la caché de partes
+    iniciar_proceso=iniciar_proceso_pool,
+    args_iniciar=(CacheResultados, {"directorio": cache_partes.directorio, "max_entradas_memoria": 256}),
+)
+planificador.registrar_metricas(registro_metricas)
+
+# Número máximo de documentos de un lote que se procesan a la vez
+LOTE_MAX_HILOS = int(os.environ.get("PARSER_LOTE_HILOS", min(8, os.cpu_count() or 1)))
 
 # Definimos qué extensiones de archivo están permitidas
 ALLOWED_EXTENSIONS = set(EXTRACTORES.keys())
 
+def _opciones_pdf():
+    """
+    Opciones de extracción de PDF de la petición (query string o formulario): calidad_pdf
+    (completa o rapida), paginas ("1-5,8,10-") y max_paginas. Solo se incluyen las
+    indicadas, para que las peticiones sin opciones compartan la caché de siempre.
+    Lanza ValueError si alguna no es válida.
+    """
+    opciones = {}
+    if calidad_pdf := request.values.get('calidad_pdf'):
+        if calidad_pdf not in CALIDADES_PDF:
+            raise ValueError(f"Calidad de PDF no válida (opciones: {', '.join(CALIDADES_PDF)})")
+        opciones['calidad_pdf'] = calidad_pdf
+    if paginas := request.values.get('paginas'):
+        analizar_rango_paginas(paginas)
+        opciones['paginas'] = paginas
+    if 'max_paginas' in request.values:
+        max_paginas = request.values.get('max_paginas', type=int)
+        if max_paginas is None or max_paginas < 1:
+            raise ValueError("max_paginas debe ser un entero positivo")
+        opciones['max_paginas'] = max_paginas
+    return opciones
+
+def _opciones_para(nombre, opciones):
+    """
+    Las opciones de _opciones_pdf solo se aplican a los PDF (como en la GUI): el resto de
+    documentos se procesa sin ellas y comparte la caché de las peticiones sin opciones.
+    """
+    return opciones if extension_de(nombre) == '.pdf' else {}
+
+def _carril(flujo, nombre, **opciones):
+    """Carril del planificador para el documento según su coste estimado."""
+    coste = estimar_coste(flujo, nombre, **opciones)
+    return planificador.elegir_carril(coste["segundos"], coste["cpu"])
+
+def _procesar(flujo, nombre, progress_callback=None, cancelacion=None, partes_recalculadas=None,
+              planificar=True, carril=None, perfil=None, **opciones):
+    """
+    Procesa un documento con la caché y las métricas de la API, aislado si está configurado
+    y, si no, en el carril del planificador que le corresponde (salvo con planificar=False).
+    Sin aislamiento, los nombres de las partes extraídas de nuevo se añaden a partes_recalculadas
+    y, con perfil (un nombre), el trabajo se perfila donde se ejecuta (ver UMBRAL_PERFIL_S).
+    Las opciones adicionales (las de _opciones_pdf) se pasan al extractor.
+    """
+    if EJECUCION_AISLADA:
+        return procesar_documento_aislado(flujo, progress_callback, cache=cache_resultados, nombre_archivo=nombre,
+                                          metricas=registro_metricas, timeout=TIMEOUT_S,
+                                          memoria_max_mb=MEMORIA_MAX_MB, cancelacion=cancelacion, **opciones)
+    argumentos = dict(cache=cache_resultados, nombre_archivo=nombre, metricas=registro_metricas,
+                      cancelacion=cancelacion, cache_partes=cache_partes, partes_recalculadas=partes_recalculadas,
+                      **opciones)
+    perfilada = functools.partial(ejecutar_perfilada, perfil, UMBRAL_PERFIL_S if perfil else None, DIRECTORIO_PERFILES)
+    if not (planificar and PLANIFICACION):
+        return perfilada(procesar_documento, flujo, progress_callback, **argumentos)
+    carril = carril or _carril(flujo, nombre, **opciones)
+    if carril == PROCESOS:
+        ejecutar = lambda funcion, *args: planificador.ejecutar(PROCESOS, perfilada, funcion, *args)
+        return procesar_documento_en_pool(flujo, ejecutar, progress_callback, **argumentos)
+    return planificador.ejecutar(carril, perfilada, procesar_documento, flujo, progress_callback, **argumentos)
+
+def _procesar_stream(flujo, nombre, partes_recalculadas=None, perfil=None, **opciones):
+    """
+    Como _procesar, pero produce el texto limpio por fragmentos en el hilo de la petición.
+    Aislado o en el carril de procesos, el texto se produce de una vez al terminar.
+    """
+    if EJECUCION_AISLADA:
+        yield _procesar(flujo, nombre, **opciones)
+        return
+    if PLANIFICACION and _carril(flujo, nombre, **opciones) == PROCESOS:
+        yield _procesar(flujo, nombre, partes_recalculadas=partes_recalculadas, carril=PROCESOS,
+                        perfil=perfil, **opciones)
+        return
+    with perfilar_si_lenta(perfil, UMBRAL_PERFIL_S if perfil else None, DIRECTORIO_PERFILES):
+        yield from procesar_documento_stream(flujo, cache=cache_resultados, nombre_archivo=nombre,
+                                             metricas=registro_metricas, cache_partes=cache_partes,
+                                             partes_recalculadas=partes_recalculadas, **opciones)
+
+# --- Respuestas en streaming y comprimidas ---
+
+# Formatos de respuesta de /procesar y su tipo MIME
+FORMATOS_RESPUESTA = {"json": "application/json", "texto": "text/plain", "markdown": "text/markdown"}
+# Caracteres de texto que se acumulan antes de enviar (y comprimir) cada bloque de la respuesta
+CARACTERES_BLOQUE_RESPUESTA = 64 * 1024
+
+def _cerrar_al_terminar(fragmentos, flujo):
+    """Produce los fragmentos y cierra flujo al terminar o si se corta la respuesta."""
+    try:
+        yield from fragmentos
+    finally:
+        flujo.close()
+
+def _zstd_disponible():
+    # Dependencia opcional: solo se comprueba que esté instalada, sin importarla
+    return importlib.util.find_spec("zstandard") is not None
+
+def _codificacion_aceptada():
+    """Elige zstd o gzip según la cabecera Accept-Encoding (zstd solo si zstandard está instalado)."""
+    candidatas = ["zstd", "gzip"] if _zstd_disponible() else ["gzip"]
+    return request.accept_encodings.best_match(candidatas)
+
+def _compresor(codificacion):
+    """Devuelve (comprimir, terminar): comprimir vacía el bloque para que el cliente lo reciba ya."""
+    if codificacion == "zstd":
+        import zstandard
+        objeto = zstandard.ZstdCompressor(level=3).compressobj()
+        return (lambda datos: objeto.compress(datos) + objeto.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+                objeto.flush)
+    objeto = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: formato gzip
+    return lambda datos: objeto.compress(datos) + objeto.flush(zlib.Z_SYNC_FLUSH), objeto.flush
+
+def _respuesta_stream(piezas, mimetype):
+    """
+    Respuesta enviada por bloques (transfer-encoding chunked) a medida que se generan
+    las piezas de texto, comprimida con zstd o gzip si el cliente lo acepta.
+    """
+    codificacion = _codificacion_aceptada()
+
+    def cuerpo():
+        comprimir, terminar = _compresor(codificacion) if codificacion else (None, None)
+        for pieza in piezas:
+            datos = pieza.encode('utf-8')
+            if comprimir: datos = comprimir(datos)
+            if datos: yield datos
+        if terminar: yield terminar()
+
+    respuesta = Response(stream_with_context(cuerpo()), mimetype=mimetype)
+    if codificacion:
+        respuesta.headers['Content-Encoding'] = codificacion
+    respuesta.vary.add('Accept-Encoding')
+    return respuesta
+
+def _agrupar(fragmentos, caracteres=CARACTERES_BLOQUE_RESPUESTA):
+    """Une los fragmentos (líneas del limpiador) en piezas de al menos `caracteres`."""
+    pieza, tamano = [], 0
+    for fragmento in fragmentos:
+        pieza.append(fragmento)
+        tamano += len(fragmento)
+        if tamano >= caracteres:
+            yield "".join(pieza)
+            pieza, tamano = [], 0
+    if pieza:
+        yield "".join(pieza)
+
+def _json_en_streaming(nombre_archivo, piezas, partes_recalculadas=None):
+    """
+    Genera el mismo objeto que /procesar ({"nombre_archivo", "texto_procesado"...}) por
+    partes, escapando cada pieza del texto por separado. Si la extracción falla a mitad,
+    el objeto se cierra con un campo "error".
+    """
+    yield '{"nombre_archivo": ' + json.dumps(nombre_archivo, ensure_ascii=False) + ', "texto_procesado": "'
+    try:
+        for pieza in piezas:
+            yield json.dumps(pieza, ensure_ascii=False)[1:-1]
+    except Exception as e:
+        yield '", "error": ' + json.dumps(f"Ha ocurrido un error al procesar el archivo: {e}", ensure_ascii=False) + '}'
+        return
+    yield '"'
+    if partes_recalculadas is not None:
+        yield ', "partes_recalculadas": ' + json.dumps(partes_recalculadas, ensure_ascii=False)
+    yield '}'
+
+def extension_de(filename):
+    """Devuelve la extensión del nombre de archivo en minúsculas y con punto."""
+    return f".{filename.rsplit('.', 1)[1].lower()}" if '.' in filename else ""
+
 def archivo_permitido(filename):
     """Comprueba si la extensión del archivo está permitida."""
-    return '.' in filename and f".{filename.rsplit('.', 1)[1].lower()}" in ALLOWED_EXTENSIONS
+    return extension_de(filename) in ALLOWED_EXTENSIONS
 
 @app.route('/procesar', methods=['POST'])
 def procesar_archivo():
     """
     Punto de entrada (endpoint) de la API.
     Recibe un archivo, lo procesa y devuelve el texto limpio.
+
+    Parámetros opcionales: formato=texto o formato=markdown devuelven el texto sin JSON
+    (text/plain o text/markdown) y stream=1 envía el JSON por partes. En esos casos la
+    respuesta se transmite a medida que se limpia el documento, comprimida con zstd o
+    gzip según Accept-Encoding; un error a mitad de un cuerpo de texto corta la conexión.
+    En los PDF, calidad_pdf=rapida, paginas=1-5,8 y max_paginas=N (ver _opciones_pdf)
+    extraen un texto aproximado o solo parte de las páginas.
     """
-    # 1. Comprobar si se ha enviado un archivo
+    # 1. Comprobar si se ha enviado un archivo (al acceder a request.files se
+    #    recibe y guarda la subida, que se mide como etapa de recepción)
+    inicio_recepcion = time.perf_counter()
     if 'file' not in request.files:
         return jsonify({"error": "No se ha enviado ningún archivo"}), 400
-    
+
     file = request.files['file']
 
     # 2. Comprobar si el nombre del archivo es válido y tiene una extensión permitida
     if file.filename == '' or not archivo_permitido(file.filename):
         return jsonify({"error": "Tipo de archivo no permitido o archivo sin nombre"}), 400
 
-    # 3. Guardar el archivo de forma segura en el servidor
+    formato = request.args.get('formato', 'json')
+    if formato not in FORMATOS_RESPUESTA:
+        return jsonify({"error": f"Formato de respuesta no válido (opciones: {', '.join(FORMATOS_RESPUESTA)})"}), 400
+    en_streaming = formato != 'json' or request.args.get('stream') == '1'
+    try:
+        opciones = _opciones_para(file.filename, _opciones_pdf())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     filename = secure_filename(file.filename)
-    ruta_archivo = UPLOAD_FOLDER / filename
-    file.save(ruta_archivo)
+    extension = extension_de(file.filename)
+    registro_metricas.observar("recepcion", time.perf_counter() - inicio_recepcion,
+                               extension=extension, tamano_bytes=request.content_length)
 
     try:
-        # 4. Usar la lógica de parser_core.py para procesar el archivo
-        texto_bruto = extraer_texto(str(ruta_archivo))
-        if texto_bruto.startswith("Error:"):
-            raise ValueError(texto_bruto)
-        
-        texto_limpio = limpiar_y_estructurar_texto(texto_bruto)
-
-        # 5. Devolver el resultado en formato JSON
-        return jsonify({
-            "nombre_archivo": filename,
-            "texto_procesado": texto_limpio
-        })
+        # 3. Procesar el archivo directamente desde el flujo de la petición, sin
+        #    guardarlo antes en disco. Si ya se procesó antes, se sirve desde la caché.
+        partes_recalculadas = []
+        informar_partes = extension in FORMATOS_POR_PARTES and not EJECUCION_AISLADA
+        if en_streaming:
+            # La respuesta se genera después de salir de la vista, cuando Flask ya ha
+            # cerrado la subida: se usa una copia del archivo, que se cierra al terminar
+            flujo = tempfile.SpooledTemporaryFile(max_size=UMBRAL_SPOOL_BYTES, mode='rb+')
+            file.save(flujo)
+            try:
+                fragmentos = _procesar_stream(flujo, file.filename, partes_recalculadas, perfil="procesar", **opciones)
+                # El primer fragmento se pide aquí: si el documento no se puede abrir
+                # se responde con un error normal en lugar de una respuesta cortada
+                primero = next(fragmentos, "")
+            except BaseException:
+                flujo.close()
+                raise
+            piezas = _agrupar(_cerrar_al_terminar(itertools.chain([primero], fragmentos), flujo))
+            if formato == 'json':
+                piezas = _json_en_streaming(filename, piezas, partes_recalculadas if informar_partes else None)
+            return _respuesta_stream(piezas, FORMATOS_RESPUESTA[formato])
 
+        texto_limpio = _procesar(file.stream, file.filename, partes_recalculadas=partes_recalculadas,
+                                perfil="procesar", **opciones)
+
+        # 4. Devolver el resultado en formato JSON. En los formatos por partes se indica
+        #    cuáles se han extraído de nuevo (vacío si el documento no ha cambiado)
+        respuesta = {"nombre_archivo": filename, "texto_procesado": texto_limpio}
+        if informar_partes:
+            respuesta["partes_recalculadas"] = partes_recalculadas
+        with registro_metricas.etapa("serializacion", extension, request.content_length):
+            return jsonify(respuesta)
+
+    except LimiteRecursosExcedido as e:
+        # Documento demasiado costoso: el proceso hijo se ha terminado
+        return jsonify({"error": str(e)}), 422
     except Exception as e:
         # Si algo falla, devolver un error claro
         return jsonify({"error": f"Ha ocurrido un error al procesar el archivo: {e}"}), 500
-    
+
+@app.route('/procesar/trozos', methods=['POST'])
+def procesar_trozos():
+    """
+    Recibe un archivo y devuelve su texto limpio dividido en trozos listos para un LLM
+    (parámetro max_caracteres, por defecto TAMANO_TROZO). La respuesta es NDJSON: una
+    línea por trozo con su texto, posiciones, sección y unidades de origen, enviada en
+    cuanto se produce. Con ejecución aislada se trocea el texto completo al terminar,
+    sin unidades de origen. Un error a mitad de documento se envía como última línea.
+    Admite las mismas opciones de PDF que /procesar.
+    """
+    if 'file' not in request.files:
+        return jsonify({"error": "No se ha enviado ningún archivo"}), 400
+    file = request.files['file']
+    if file.filename == '' or not archivo_permitido(file.filename):
+        return jsonify({"error": "Tipo de archivo no permitido o archivo sin nombre"}), 400
+    max_caracteres = request.values.get('max_caracteres', TAMANO_TROZO, type=int)
+    if max_caracteres <= 0:
+        return jsonify({"error": "max_caracteres debe ser un entero positivo"}), 400
+    try:
+        opciones = _opciones_para(file.filename, _opciones_pdf())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # La respuesta se genera después de salir de la vista: se usa una copia del archivo
+    flujo = tempfile.SpooledTemporaryFile(max_size=UMBRAL_SPOOL_BYTES, mode='rb+')
+    file.save(flujo)
+    nombre, filename = file.filename, secure_filename(file.filename)
+
+    def generar_trozos():
+        try:
+            if EJECUCION_AISLADA:
+                trozos = trocear_texto(_procesar(flujo, nombre, **opciones), max_caracteres)
+            else:
+                trozos = trocear_documento(flujo, nombre_archivo=nombre, max_caracteres=max_caracteres, **opciones)
+            for trozo in trozos:
+                yield json.dumps({"nombre_archivo": filename, **trozo}, ensure_ascii=False) + "\n"
+        except Exception as e:
+            yield json.dumps({"nombre_archivo": filename,
+                              "error": f"Ha ocurrido un error al procesar el archivo: {e}"}, ensure_ascii=False) + "\n"
+        finally:
+            flujo.close()
+
+    return _respuesta_stream(_agrupar(generar_trozos()), 'application/x-ndjson')
+
+@app.route('/procesar/lote', methods=['POST'])
+def procesar_lote():
+    """
+    Recibe varios archivos en el campo 'files' y los procesa en paralelo con un pool
+    de hilos acotado. La respuesta es NDJSON: una línea JSON por documento, enviada en
+    cuanto ese documento termina. Un fallo en un archivo no interrumpe el resto del lote.
+    Las opciones de PDF de /procesar se aplican a todos los PDF del lote.
+    """
+    archivos = request.files.getlist('files')
+    if not archivos:
+        return jsonify({"error": "No se ha enviado ningún archivo"}), 400
+    try:
+        opciones = _opciones_pdf()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Flask cierra los archivos de la petición al terminar la vista, así que cada uno se
+    # traspasa a un SpooledTemporaryFile propio (en memoria salvo que supere el umbral)
+    documentos = []
+    for file in archivos:
+        flujo = None
+        if file.filename != '' and archivo_permitido(file.filename):
+            flujo = tempfile.SpooledTemporaryFile(max_size=UMBRAL_SPOOL_BYTES, mode='rb+')
+            file.save(flujo)
+        documentos.append((file.filename, flujo))
+
+    def generar_resultados():
+        with ThreadPoolExecutor(max_workers=LOTE_MAX_HILOS) as pool:
+            futuros = [pool.submit(_procesar_documento_lote, indice, nombre, flujo, opciones)
+                       for indice, (nombre, flujo) in enumerate(documentos)]
+            for futuro in as_completed(futuros):
+                yield json.dumps(futuro.result(), ensure_ascii=False) + "\n"
+
+    return _respuesta_stream(generar_resultados(), 'application/x-ndjson')
+
+def _procesar_documento_lote(indice, nombre, flujo, opciones):
+    """Procesa un documento del lote y devuelve su resultado o su error como diccionario."""
+    if flujo is None:
+        return {"indice": indice, "nombre_archivo": nombre,
+                "error": "Tipo de archivo no permitido o archivo sin nombre"}
+    filename = secure_filename(nombre)
+    try:
+        texto_limpio = _procesar(flujo, nombre, **_opciones_para(nombre, opciones))
+        return {"indice": indice, "nombre_archivo": filename, "texto_procesado": texto_limpio}
+    except LimiteRecursosExcedido as e:
+        return {"indice": indice, "nombre_archivo": filename, "error": str(e)}
+    except Exception as e:
+        return {"indice": indice, "nombre_archivo": filename,
+                "error": f"Ha ocurrido un error al procesar el archivo: {e}"}
     finally:
-        # 6. Eliminar el archivo temporal después de procesarlo
-        if ruta_archivo.exists():
-            os.remove(ruta_archivo)
+        flujo.close()
+
+@app.route('/trabajos', methods=['POST'])
+def crear_trabajo():
+    """
+    Encola el procesamiento de un archivo y responde de inmediato con el id del trabajo.
+    El progreso se consulta en /trabajos/<id> y el texto en /trabajos/<id>/resultado.
+    Admite las mismas opciones de PDF que /procesar.
+    """
+    if 'file' not in request.files:
+        return jsonify({"error": "No se ha enviado ningún archivo"}), 400
+    file = request.files['file']
+    if file.filename == '' or not archivo_permitido(file.filename):
+        return jsonify({"error": "Tipo de archivo no permitido o archivo sin nombre"}), 400
+    try:
+        opciones = _opciones_para(file.filename, _opciones_pdf())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # El flujo de la petición se cierra al responder: el trabajo usa su propia copia
+    flujo = tempfile.SpooledTemporaryFile(max_size=UMBRAL_SPOOL_BYTES, mode='rb+')
+    file.save(flujo)
+    filename = secure_filename(file.filename)
+    id_trabajo = gestor_trabajos.enviar(_procesar_flujo_trabajo, flujo, file.filename,
+                                        metadatos={"nombre_archivo": filename}, liberar=flujo.close, **opciones)
+    return jsonify({"id": id_trabajo, "estado_url": f"/trabajos/{id_trabajo}"}), 202
+
+def _procesar_flujo_trabajo(flujo, nombre, progress_callback=None, cancelacion=None, **opciones):
+    try:
+        return _procesar(flujo, nombre, progress_callback, cancelacion, planificar=False, **opciones)
+    finally:
+        flujo.close()
+
+@app.route('/trabajos/<id_trabajo>', methods=['GET'])
+def estado_trabajo(id_trabajo):
+    """Devuelve el estado y el progreso (0-100) de un trabajo."""
+    trabajo = gestor_trabajos.estado(id_trabajo)
+    if trabajo is None:
+        return jsonify({"error": "Trabajo no encontrado o caducado"}), 404
+    return jsonify(trabajo)
+
+@app.route('/trabajos/<id_trabajo>', methods=['DELETE'])
+def cancelar_trabajo(id_trabajo):
+    """Cancela un trabajo pendiente o en curso."""
+    if gestor_trabajos.cancelar(id_trabajo):
+        return jsonify({"id": id_trabajo, "cancelacion_solicitada": True}), 202
+    trabajo = gestor_trabajos.estado(id_trabajo)
+    if trabajo is None:
+        return jsonify({"error": "Trabajo no encontrado o caducado"}), 404
+    if trabajo["estado"] in TERMINADOS:
+        return jsonify({"error": f"El trabajo ya ha terminado ({trabajo['estado']})"}), 409
+    # Existe en disco pero lo ejecuta otro worker de la API
+    return jsonify({"error": "El trabajo se está ejecutando en otro proceso y no puede cancelarse desde aquí"}), 409
+
+@app.route('/trabajos/<id_trabajo>/resultado', methods=['GET'])
+def resultado_trabajo(id_trabajo):
+    """Devuelve el texto procesado de un trabajo terminado."""
+    trabajo = gestor_trabajos.estado(id_trabajo)
+    if trabajo is None:
+        return jsonify({"error": "Trabajo no encontrado o caducado"}), 404
+    if trabajo["estado"] == ERROR:
+        return jsonify({"error": f"Ha ocurrido un error al procesar el archivo: {trabajo['error']}"}), 500
+    if trabajo["estado"] == CANCELADO:
+        return jsonify({"error": "El trabajo fue cancelado"}), 410
+    if trabajo["estado"] != COMPLETADO:
+        return jsonify(trabajo), 202
+    return jsonify({
+        "nombre_archivo": trabajo.get("nombre_archivo"),
+        "texto_procesado": gestor_trabajos.resultado(id_trabajo)
+    })
+
+@app.route('/cache', methods=['GET'])
+def estadisticas_cache():
+    """Devuelve los contadores de aciertos y fallos de la caché de resultados."""
+    return jsonify(cache_resultados.estadisticas())
+
+@app.route('/planificador', methods=['GET'])
+def estadisticas_planificador():
+    """Devuelve los documentos en cola y en curso de cada carril del planificador."""
+    return jsonify(planificador.estadisticas())
+
+@app.route('/metrics', methods=['GET'])
+def metricas():
+    """Métricas por etapa, peticiones y caché en el formato de texto de Prometheus."""
+    return Response(registro_metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
+@app.after_request
+def contar_peticion(response):
+    ruta = request.url_rule.rule if request.url_rule else "desconocida"
+    registro_metricas.contar("peticiones", ruta=ruta, codigo=response.status_code)
+    return response
 
 # Ruta principal para comprobar que la API está funcionando
 @app.route('/')
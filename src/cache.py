@@ -0,0 +1,146 @@
+# src/cache.py
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+class CacheResultados:
+    """
+    Caché de textos procesados en dos niveles: un LRU en memoria y, opcionalmente,
+    un directorio en disco con tamaño máximo. Las claves las genera
+    parser_core.clave_cache (hash del contenido + versiones de extractores y reglas),
+    así que un cambio en las reglas de limpieza produce claves nuevas y las entradas
+    antiguas dejan de usarse hasta que la política de expulsión las elimina.
+    """
+
+    def __init__(self, directorio=None, max_entradas_memoria=64,
+                 max_caracteres_memoria=64 * 1024 * 1024, max_bytes_disco=512 * 1024 * 1024):
+        self.max_entradas_memoria = max_entradas_memoria
+        self.max_caracteres_memoria = max_caracteres_memoria
+        self.max_bytes_disco = max_bytes_disco
+        self._memoria = OrderedDict()
+        self._caracteres_memoria = 0
+        self._lock = threading.Lock()
+        self._contadores = {"aciertos_memoria": 0, "aciertos_disco": 0, "fallos": 0,
+                            "guardados": 0, "expulsiones_disco": 0}
+        self.directorio = Path(directorio) if directorio else None
+        self._bytes_disco = 0
+        if self.directorio:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            self._bytes_disco = sum(f.stat().st_size for f in self.directorio.glob("*/*.txt"))
+
+    # --- API pública ---
+
+    def obtener(self, clave: str):
+        """Devuelve el texto asociado a la clave o None si no está en caché."""
+        with self._lock:
+            texto = self._memoria.get(clave)
+            if texto is not None:
+                self._memoria.move_to_end(clave)
+                self._contadores["aciertos_memoria"] += 1
+                return texto
+        texto = self._leer_disco(clave)
+        with self._lock:
+            if texto is None:
+                self._contadores["fallos"] += 1
+                return None
+            self._contadores["aciertos_disco"] += 1
+            self._guardar_memoria(clave, texto)
+        return texto
+
+    def guardar(self, clave: str, texto: str):
+        with self._lock:
+            self._contadores["guardados"] += 1
+            self._guardar_memoria(clave, texto)
+        if self.directorio:
+            self._escribir_disco(clave, texto)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            stats = dict(self._contadores)
+            stats["entradas_memoria"] = len(self._memoria)
+            stats["caracteres_memoria"] = self._caracteres_memoria
+            stats["bytes_disco"] = self._bytes_disco
+        return stats
+
+    def vaciar(self):
+        """Elimina todas las entradas de ambos niveles."""
+        with self._lock:
+            self._memoria.clear()
+            self._caracteres_memoria = 0
+            if self.directorio:
+                for archivo in self.directorio.glob("*/*.txt"):
+                    archivo.unlink(missing_ok=True)
+                self._bytes_disco = 0
+
+    # --- Nivel en memoria (se llama con el lock adquirido) ---
+
+    def _guardar_memoria(self, clave, texto):
+        tamano = len(texto)
+        if tamano > self.max_caracteres_memoria:
+            return
+        anterior = self._memoria.pop(clave, None)
+        if anterior is not None:
+            self._caracteres_memoria -= len(anterior)
+        self._memoria[clave] = texto
+        self._caracteres_memoria += tamano
+        while (len(self._memoria) > self.max_entradas_memoria
+               or self._caracteres_memoria > self.max_caracteres_memoria):
+            _, expulsado = self._memoria.popitem(last=False)
+            self._caracteres_memoria -= len(expulsado)
+
+    # --- Nivel en disco ---
+
+    def _ruta_disco(self, clave):
+        return self.directorio / clave[:2] / f"{clave}.txt"
+
+    def _leer_disco(self, clave):
+        if not self.directorio:
+            return None
+        ruta = self._ruta_disco(clave)
+        try:
+            texto = ruta.read_text(encoding='utf-8')
+            os.utime(ruta)  # Marca la entrada como usada recientemente para la expulsión
+            return texto
+        except OSError:
+            return None
+
+    def _escribir_disco(self, clave, texto):
+        ruta = self._ruta_disco(clave)
+        datos = texto.encode('utf-8')
+        if len(datos) > self.max_bytes_disco:
+            return
+        try:
+            ruta.parent.mkdir(exist_ok=True)
+            # Escritura atómica: otro proceso nunca ve un archivo a medio escribir
+            temporal = ruta.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            temporal.write_bytes(datos)
+            tamano_previo = ruta.stat().st_size if ruta.exists() else 0
+            os.replace(temporal, ruta)
+        except OSError:
+            return
+        with self._lock:
+            self._bytes_disco += len(datos) - tamano_previo
+            if self._bytes_disco > self.max_bytes_disco:
+                self._expulsar_disco()
+
+    def _expulsar_disco(self):
+        # Se eliminan primero las entradas usadas hace más tiempo hasta bajar del 90 % del límite
+        archivos = []
+        for archivo in self.directorio.glob("*/*.txt"):
+            try:
+                st = archivo.stat()
+            except OSError:
+                continue
+            archivos.append((st.st_mtime, st.st_size, archivo))
+        archivos.sort()
+        total = sum(tamano for _, tamano, _ in archivos)
+        objetivo = self.max_bytes_disco * 0.9
+        for _, tamano, archivo in archivos:
+            if total <= objetivo:
+                break
+            archivo.unlink(missing_ok=True)
+            total -= tamano
+            self._contadores["expulsiones_disco"] += 1
+        self._bytes_disco = total
@@ -0,0 +1,339 @@
+# src/lote.py
+"""
+Procesamiento por lotes desde la línea de comandos, sin GUI ni API.
+
+Recorre los directorios indicados, selecciona los archivos con extensión soportada
+(EXTRACTORES) y los reparte entre un pool de procesos. Los resultados se escriben
+en JSONL (una línea por documento, con los mismos campos que /procesar/lote, o una
+por trozo con --trozos, como /procesar/trozos), en un único archivo o en fragmentos
+de N documentos. Un manifiesto JSONL registra cada
+documento terminado, de modo que una ejecución interrumpida se reanuda donde se quedó.
+
+Uso:
+    python src/lote.py archivo/ --salida resultados.jsonl --procesos 8 --timeout 120
+    python src/lote.py archivo/ --salida resultados/ --fragmento 10000 --cache ./cache_resultados
+    python src/lote.py archivo/ --salida trozos.jsonl --trozos 4000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from parser_core import EXTRACTORES, CALIDADES_PDF, analizar_rango_paginas, procesar_documento, trocear_documento
+from cache import CacheResultados
+
+# Estados de cada documento en el manifiesto
+OK, ERROR, TIEMPO_AGOTADO = "ok", "error", "tiempo_agotado"
+
+
+def buscar_archivos(entradas, extensiones):
+    """Genera, en orden estable, los archivos de las entradas con extensión soportada."""
+    for entrada in entradas:
+        entrada = Path(entrada)
+        if entrada.is_file():
+            if entrada.suffix.lower() in extensiones:
+                yield entrada
+            continue
+        for raiz, directorios, archivos in os.walk(entrada):
+            directorios.sort()
+            for nombre in sorted(archivos):
+                if Path(nombre).suffix.lower() in extensiones:
+                    yield Path(raiz) / nombre
+
+
+# --- Manifiesto ---
+
+class Manifiesto:
+    """
+    Registro en JSONL de los documentos ya procesados. Cada archivo se identifica por
+    ruta, tamaño y fecha de modificación: si cambia, se vuelve a procesar.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = Path(ruta)
+        self._terminados = {}
+        if self.ruta.exists():
+            with self.ruta.open(encoding='utf-8') as f:
+                for linea in f:
+                    try:
+                        entrada = json.loads(linea)
+                    except ValueError:
+                        continue  # Última línea truncada por una interrupción
+                    self._terminados[(entrada["ruta"], entrada["tamano"], entrada["mtime"])] = entrada["estado"]
+        self._archivo = self.ruta.open('a', encoding='utf-8')
+
+    def pendiente(self, ruta, datos, reintentar_fallidos=False) -> bool:
+        estado = self._terminados.get((str(ruta.resolve()), datos.st_size, datos.st_mtime_ns))
+        return estado is None or (reintentar_fallidos and estado != OK)
+
+    def registrar(self, ruta, datos, estado, segundos, error=None):
+        entrada = {"ruta": str(ruta.resolve()), "tamano": datos.st_size, "mtime": datos.st_mtime_ns,
+                   "estado": estado, "segundos": round(segundos, 4)}
+        if error:
+            entrada["error"] = error
+        self._archivo.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+        self._archivo.flush()
+
+    def cerrar(self):
+        self._archivo.close()
+
+
+# --- Salida JSONL (única o fragmentada) ---
+
+class SalidaJsonl:
+    """
+    Escribe los resultados en un archivo JSONL o, con documentos_por_fragmento, en
+    archivos parte-00000.jsonl, parte-00001.jsonl... dentro de un directorio. Al
+    reanudar se añade al archivo único o se empieza un fragmento nuevo.
+    """
+
+    def __init__(self, ruta, documentos_por_fragmento=None):
+        self.ruta = Path(ruta)
+        self.documentos_por_fragmento = documentos_por_fragmento
+        self._archivo = None
+        self._en_fragmento = 0
+        if documentos_por_fragmento:
+            self.ruta.mkdir(parents=True, exist_ok=True)
+            self._siguiente = len(list(self.ruta.glob("parte-*.jsonl")))
+        else:
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+            self._archivo = self.ruta.open('a', encoding='utf-8')
+
+    def escribir(self, *registros):
+        """Escribe las líneas de un documento (varias si se trocea), siempre en el mismo fragmento."""
+        if self.documentos_por_fragmento and (self._archivo is None or self._en_fragmento >= self.documentos_por_fragmento):
+            if self._archivo:
+                self._archivo.close()
+            self._archivo = (self.ruta / f"parte-{self._siguiente:05d}.jsonl").open('a', encoding='utf-8')
+            self._siguiente += 1
+            self._en_fragmento = 0
+        for registro in registros:
+            self._archivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        self._archivo.flush()
+        self._en_fragmento += 1
+
+    def cerrar(self):
+        if self._archivo:
+            self._archivo.close()
+
+
+# --- Trabajo de cada proceso ---
+
+_cache_proceso = None
+_cache_partes_proceso = None
+
+class _TiempoAgotado(Exception):
+    pass
+
+def _iniciar_proceso(directorio_cache):
+    global _cache_proceso, _cache_partes_proceso
+    # Ctrl+C lo gestiona el proceso principal, que cancela el pool ordenadamente
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if directorio_cache:
+        _cache_proceso = CacheResultados(directorio=directorio_cache, max_entradas_memoria=8)
+        # Texto por partes de EPUB/DOCX/PPTX/XLSX: las versiones nuevas solo extraen lo modificado
+        _cache_partes_proceso = CacheResultados(directorio=Path(directorio_cache) / "partes", max_entradas_memoria=256)
+
+def _alarma(signum, frame):
+    raise _TiempoAgotado()
+
+def _procesar_archivo(ruta, timeout, opciones, max_caracteres_trozo=None):
+    """
+    Procesa un archivo en un proceso del pool y devuelve (estado, texto o error, segundos).
+    Con max_caracteres_trozo, en lugar del texto devuelve la lista de trozos (sin caché).
+    """
+    # El tiempo máximo se aplica con SIGALRM, disponible en Unix; en Windows no se limita
+    limitar = timeout and hasattr(signal, "setitimer")
+    if limitar:
+        signal.signal(signal.SIGALRM, _alarma)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    inicio = time.perf_counter()
+    try:
+        # procesos=1: el lote ya reparte los archivos entre procesos
+        if max_caracteres_trozo:
+            trozos = list(trocear_documento(ruta, max_caracteres=max_caracteres_trozo, cache_partes=_cache_partes_proceso,
+                                            procesos=1, **opciones))
+            return OK, trozos, time.perf_counter() - inicio
+        texto = procesar_documento(ruta, cache=_cache_proceso, cache_partes=_cache_partes_proceso,
+                                   procesos=1, **opciones)
+        return OK, texto, time.perf_counter() - inicio
+    except _TiempoAgotado:
+        return TIEMPO_AGOTADO, f"Tiempo máximo de {timeout} s superado", time.perf_counter() - inicio
+    except Exception as e:
+        return ERROR, str(e), time.perf_counter() - inicio
+    finally:
+        if limitar:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+# --- Ejecución del lote ---
+
+def ejecutar_lote(entradas, salida, manifiesto=None, procesos=None, timeout=None,
+                  documentos_por_fragmento=None, directorio_cache=None, reintentar_fallidos=False,
+                  informar=None, max_caracteres_trozo=None, **opciones):
+    """
+    Procesa todos los archivos soportados de las entradas y devuelve un resumen
+    (documentos, errores, tiempo agotado, omitidos, bytes, duración y rendimiento).
+    informar(resumen_parcial) se llama tras cada documento, si se indica. Con
+    max_caracteres_trozo cada documento se escribe como una línea por trozo
+    (trocear_documento). Las opciones adicionales se pasan a procesar_documento
+    (p. ej. max_filas=1000 para hojas de cálculo).
+    """
+    procesos = procesos or os.cpu_count() or 1
+    manifiesto = Manifiesto(manifiesto or f"{str(salida).rstrip('/')}.manifiesto.jsonl")
+    escritor = SalidaJsonl(salida, documentos_por_fragmento)
+    resumen = {"procesados": 0, OK: 0, ERROR: 0, TIEMPO_AGOTADO: 0, "omitidos": 0, "bytes": 0, "fallos": []}
+    inicio = time.perf_counter()
+    en_vuelo = {}
+    maximo_en_vuelo = procesos * 4
+    archivos = buscar_archivos(entradas, set(EXTRACTORES))
+
+    def nuevo_pool():
+        return ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso,
+                                   initargs=(directorio_cache,))
+
+    def recoger(terminados):
+        roto = False
+        for futuro in terminados:
+            ruta, datos = en_vuelo.pop(futuro)
+            try:
+                estado, contenido, segundos = futuro.result()
+            except BrokenProcessPool as e:
+                # Un proceso murió (falta de memoria, fallo de una biblioteca en C...): el
+                # pool queda inservible y todos sus archivos en vuelo se marcan como error
+                roto = True
+                estado, contenido, segundos = ERROR, f"El proceso de extracción terminó de forma inesperada: {e}", 0.0
+            registro = {"ruta": str(ruta), "nombre_archivo": ruta.name}
+            if estado == OK and max_caracteres_trozo:
+                escritor.escribir(*({**registro, **trozo} for trozo in contenido))
+            else:
+                registro["texto_procesado" if estado == OK else "error"] = contenido
+                escritor.escribir(registro)
+            manifiesto.registrar(ruta, datos, estado, segundos, None if estado == OK else contenido)
+            resumen["procesados"] += 1
+            resumen[estado] += 1
+            resumen["bytes"] += datos.st_size
+            if estado != OK:
+                resumen["fallos"].append({"ruta": str(ruta), "estado": estado, "error": contenido})
+            if informar:
+                informar(resumen)
+        return roto
+
+    pool = nuevo_pool()
+
+    def reiniciar_pool():
+        # Los archivos en vuelo del pool roto se recogen (como error) y se crea uno nuevo
+        nonlocal pool
+        recoger(wait(en_vuelo)[0])
+        pool.shutdown(wait=False)
+        pool = nuevo_pool()
+
+    def enviar(ruta, datos):
+        try:
+            futuro = pool.submit(_procesar_archivo, ruta, timeout, opciones, max_caracteres_trozo)
+        except BrokenProcessPool:
+            # Un proceso murió después del último wait: el archivo se reenvía al pool nuevo
+            reiniciar_pool()
+            futuro = pool.submit(_procesar_archivo, ruta, timeout, opciones, max_caracteres_trozo)
+        en_vuelo[futuro] = (ruta, datos)
+
+    try:
+        for ruta in archivos:
+            datos = ruta.stat()
+            if not manifiesto.pendiente(ruta, datos, reintentar_fallidos):
+                resumen["omitidos"] += 1
+                continue
+            # Solo se mantienen unos pocos archivos en vuelo por proceso para no
+            # acumular millones de futuros con archivos de gran tamaño
+            if len(en_vuelo) >= maximo_en_vuelo:
+                terminados, _ = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                if recoger(terminados):
+                    reiniciar_pool()
+            enviar(ruta, datos)
+        while en_vuelo:
+            terminados, _ = wait(en_vuelo, return_when=FIRST_COMPLETED)
+            recoger(terminados)
+        pool.shutdown()
+    except KeyboardInterrupt:
+        # Lo ya escrito queda en el manifiesto; la próxima ejecución continúa desde ahí
+        pool.shutdown(wait=False, cancel_futures=True)
+        resumen["interrumpido"] = True
+    finally:
+        escritor.cerrar()
+        manifiesto.cerrar()
+
+    segundos = time.perf_counter() - inicio
+    resumen["segundos"] = round(segundos, 2)
+    resumen["documentos_s"] = round(resumen["procesados"] / segundos, 2) if segundos else None
+    resumen["mb_s"] = round(resumen["bytes"] / 1024 / 1024 / segundos, 2) if segundos else None
+    return resumen
+
+
+def _mostrar_progreso(resumen):
+    if resumen["procesados"] % 100 == 0:
+        print(f"  {resumen['procesados']} documentos ({resumen[ERROR]} errores, "
+              f"{resumen[TIEMPO_AGOTADO]} con tiempo agotado)", file=sys.stderr, flush=True)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="Extrae y limpia el texto de todos los documentos de uno o varios directorios.")
+    parser.add_argument("entradas", nargs="+", help="Directorios o archivos a procesar")
+    parser.add_argument("--salida", required=True,
+                        help="Archivo JSONL de resultados (o directorio si se usa --fragmento)")
+    parser.add_argument("--fragmento", type=int, metavar="N",
+                        help="Divide la salida en archivos de N documentos dentro del directorio --salida")
+    parser.add_argument("--manifiesto", help="Manifiesto para reanudar (por defecto <salida>.manifiesto.jsonl)")
+    parser.add_argument("--procesos", type=int, help="Procesos en paralelo (por defecto, uno por CPU)")
+    parser.add_argument("--timeout", type=float, help="Segundos máximos por archivo")
+    parser.add_argument("--cache", help="Directorio de la caché de resultados compartida")
+    parser.add_argument("--reintentar-fallidos", action="store_true",
+                        help="Vuelve a procesar los archivos que fallaron en ejecuciones anteriores")
+    parser.add_argument("--max-filas", type=int,
+                        help="Máximo de filas por hoja (XLSX) o por archivo (CSV)")
+    parser.add_argument("--muestreo-filas", type=int, metavar="N",
+                        help="Toma solo una de cada N filas de las hojas de cálculo y CSV")
+    parser.add_argument("--conservar-repetidas", action="store_true",
+                        help="No quita las cabeceras y pies de página repetidos en PDF")
+    parser.add_argument("--calidad-pdf", choices=CALIDADES_PDF,
+                        help="rapida extrae el texto de los PDF con pdfium, sin el análisis de maquetación")
+    parser.add_argument("--paginas", help="Páginas de los PDF que se extraen (p. ej. 1-5,8,10-)")
+    parser.add_argument("--max-paginas", type=int, metavar="N", help="Extrae como mucho N páginas de cada PDF")
+    parser.add_argument("--trozos", type=int, metavar="CARACTERES",
+                        help="Escribe cada documento como trozos de como máximo CARACTERES (una línea por trozo)")
+    parser.add_argument("--resumen", help="Guarda el resumen final en este archivo JSON")
+    args = parser.parse_args()
+    opciones = {k: v for k, v in (("max_filas", args.max_filas), ("muestreo_filas", args.muestreo_filas),
+                                  ("calidad_pdf", args.calidad_pdf), ("paginas", args.paginas),
+                                  ("max_paginas", args.max_paginas)) if v is not None}
+    try:
+        if args.paginas: analizar_rango_paginas(args.paginas)
+        if args.max_paginas is not None and args.max_paginas < 1: raise ValueError("--max-paginas debe ser positivo.")
+    except ValueError as e:
+        parser.error(str(e))
+    if args.conservar_repetidas:
+        opciones["quitar_repetidas"] = False
+
+    resumen = ejecutar_lote(args.entradas, args.salida, args.manifiesto, args.procesos, args.timeout,
+                            args.fragmento, args.cache, args.reintentar_fallidos, _mostrar_progreso,
+                            max_caracteres_trozo=args.trozos, **opciones)
+
+    print(f"\nDocumentos procesados: {resumen['procesados']} en {resumen['segundos']} s "
+          f"({resumen['documentos_s']} doc/s, {resumen['mb_s']} MB/s)", file=sys.stderr)
+    print(f"Correctos: {resumen[OK]} | Errores: {resumen[ERROR]} | Tiempo agotado: {resumen[TIEMPO_AGOTADO]} | "
+          f"Omitidos (ya procesados): {resumen['omitidos']}", file=sys.stderr)
+    for fallo in resumen["fallos"][:20]:
+        print(f"  [{fallo['estado']}] {fallo['ruta']}: {fallo['error']}", file=sys.stderr)
+    if len(resumen["fallos"]) > 20:
+        print(f"  ... y {len(resumen['fallos']) - 20} fallos más (ver el manifiesto)", file=sys.stderr)
+    if resumen.get("interrumpido"):
+        print("Ejecución interrumpida: vuelve a lanzar el mismo comando para continuar.", file=sys.stderr)
+    if args.resumen:
+        Path(args.resumen).write_text(json.dumps(resumen, indent=2, ensure_ascii=False), encoding='utf-8')
+    sys.exit(1 if resumen[ERROR] or resumen[TIEMPO_AGOTADO] else 0)
@@ -1,16 +1,22 @@
 # src/main.py
 import sys
 import json
+import os
+import multiprocessing
+import threading
 from pathlib import Path
-from PySide6.QtCore import QObject, Signal, QThread, Qt
-from PySide6.QtGui import QFont
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal, Qt
+from PySide6.QtGui import QFont, QTextCursor
 from PySide6.QtWidgets import (QApplication, QWidget, QPushButton, QVBoxLayout, QHBoxLayout,
-                               QFileDialog, QLabel, QTextEdit, QProgressBar,
+                               QFileDialog, QLabel, QPlainTextEdit, QProgressBar, QLineEdit, QSpinBox,
                                QFrame, QStyle, QComboBox, QDialog,
-                               QCheckBox, QDialogButtonBox, QMessageBox)
+                               QCheckBox, QDialogButtonBox, QMessageBox,
+                               QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView)
 
 # Importamos las funciones lógicas de parser_core
-from parser_core import (EXTRACTORES, extraer_texto, limpiar_y_estructurar_texto)
+from parser_core import (EXTRACTORES, procesar_documento, ExtraccionCancelada, CALIDADES_PDF,
+                         analizar_rango_paginas)
+from cache import CacheResultados
 
 # --- Generación dinámica de formatos ---
 formatos_soportados_str = ", ".join(sorted(EXTRACTORES.keys()))
@@ -45,7 +51,7 @@ APP_STYLESHEET = f"""
     }}
     QPushButton:hover {{ background-color: {StyleConfig.COLOR_ACCENT_HOVER}; }}
     QPushButton:disabled {{ background-color: #3B4252; color: #4C566A; }}
-    QTextEdit, QComboBox {{
+    QPlainTextEdit, QComboBox {{
         background-color: {StyleConfig.COLOR_BACKGROUND_INPUT};
         border: 1px solid #4C566A; border-radius: 4px;
         padding: 5px;
@@ -61,8 +67,15 @@ APP_STYLESHEET = f"""
 # --- Traducciones Simplificadas ---
 TRANSLATIONS = {
     'es': {
-        "window_title": "Dissentis.AI Parser", "drop_zone_label": "Arrastra un archivo aquí",
-        "select_file_button": " Seleccionar Archivo...", "save_result_button": " Guardar Resultado",
+        "window_title": "Dissentis.AI Parser", "drop_zone_label": "Arrastra archivos o carpetas aquí",
+        "select_file_button": " Seleccionar Archivos...", "save_result_button": " Guardar Resultado",
+        "save_all_button": " Guardar Todo", "cancel_button": " Cancelar",
+        "queue_file": "Archivo", "queue_status": "Estado", "queue_progress": "Progreso",
+        "job_queued": "En cola", "job_processing": "Procesando", "job_done": "Completado",
+        "job_error": "Error", "job_cancelled": "Cancelado",
+        "status_queue": "Procesando archivos: {done} de {total} terminados...",
+        "status_queue_done": "Cola terminada: {ok} completados, {errors} con error.",
+        "status_saved_all": "{count} archivos guardados en: {path}", "dialog_save_folder": "Seleccionar carpeta de destino",
         "status_waiting": "Esperando archivo...", "status_processing": "Procesando: {filename}",
         "status_success": "Éxito: Archivo procesado correctamente.", "status_error": "Error: {error_msg}",
         "status_saved": "Archivo guardado en: {path}", "word_count_label": "Palabras: {count}",
@@ -74,11 +87,21 @@ TRANSLATIONS = {
         "welcome_checkbox": "No volver a mostrar este mensaje", "welcome_ok_button": "Entendido",
         "dialog_select_file": "Seleccionar archivo", "dialog_save_file": "Guardar archivo",
         "supported_files": "Documentos Soportados", "all_files": "Todos los Archivos",
-        "error_dialog_title": "Error"
+        "error_dialog_title": "Error",
+        "pdf_quality_completa": "PDF: calidad completa", "pdf_quality_rapida": "PDF: rápido",
+        "pdf_pages_placeholder": "Páginas PDF (p. ej. 1-5,8)", "pdf_max_pages": "Máx. páginas: ",
+        "pdf_all_pages": "Máx. páginas: todas"
     },
     'en': {
-        "window_title": "Dissentis.AI Parser", "drop_zone_label": "Drag a file here",
-        "select_file_button": " Select File...", "save_result_button": " Save Result",
+        "window_title": "Dissentis.AI Parser", "drop_zone_label": "Drag files or folders here",
+        "select_file_button": " Select Files...", "save_result_button": " Save Result",
+        "save_all_button": " Save All", "cancel_button": " Cancel",
+        "queue_file": "File", "queue_status": "Status", "queue_progress": "Progress",
+        "job_queued": "Queued", "job_processing": "Processing", "job_done": "Done",
+        "job_error": "Error", "job_cancelled": "Cancelled",
+        "status_queue": "Processing files: {done} of {total} finished...",
+        "status_queue_done": "Queue finished: {ok} done, {errors} with errors.",
+        "status_saved_all": "{count} files saved to: {path}", "dialog_save_folder": "Select destination folder",
         "status_waiting": "Waiting for file...", "status_processing": "Processing: {filename}",
         "status_success": "Success: File processed correctly.", "status_error": "Error: {error_msg}",
         "status_saved": "File saved to: {path}", "word_count_label": "Words: {count}",
@@ -90,7 +113,10 @@ TRANSLATIONS = {
         "welcome_checkbox": "Don't show this message again", "welcome_ok_button": "Got it",
         "dialog_select_file": "Select file", "dialog_save_file": "Save file",
         "supported_files": "Supported Documents", "all_files": "All Files",
-        "error_dialog_title": "Error"
+        "error_dialog_title": "Error",
+        "pdf_quality_completa": "PDF: full quality", "pdf_quality_rapida": "PDF: fast",
+        "pdf_pages_placeholder": "PDF pages (e.g. 1-5,8)", "pdf_max_pages": "Max pages: ",
+        "pdf_all_pages": "Max pages: all"
     }
 }
 
@@ -105,28 +131,99 @@ def load_settings():
 def save_settings(settings):
     with open(CONFIG_FILE, 'w', encoding='utf-8') as f: json.dump(settings, f, indent=4)
 
-# --- Worker para procesamiento en segundo plano ---
-class ParserWorker(QObject):
-    trabajo_terminado = Signal(str) # Devuelve un único string
-    error_ocurrido = Signal(str)
-    progreso_actualizado = Signal(int)
+# --- Caché de resultados (evita reprocesar documentos ya vistos) ---
+CACHE_DIR = Path.home() / ".parser_pro_cache"
+CACHE_RESULTADOS = CacheResultados(directorio=CACHE_DIR)
+# Texto por partes (capítulos, diapositivas, hojas): al reabrir una versión nueva de un
+# EPUB, DOCX, PPTX o XLSX solo se extraen las partes modificadas
+CACHE_PARTES = CacheResultados(directorio=CACHE_DIR / "partes", max_entradas_memoria=1024)
 
-    def __init__(self, ruta_archivo: str):
+# --- Tareas en segundo plano (cola de documentos) ---
+class SenalesTarea(QObject):
+    # QRunnable no es un QObject: las señales de cada tarea viven en este objeto auxiliar
+    progreso_actualizado = Signal(int, int)  # fila, porcentaje
+    trabajo_terminado = Signal(int, str, int, int)  # fila, texto limpio, palabras, caracteres
+    error_ocurrido = Signal(int, str)
+    trabajo_cancelado = Signal(int)
+
+class TareaDocumento(QRunnable):
+    """Procesa un documento de la cola en un hilo del QThreadPool."""
+    def __init__(self, fila: int, ruta_archivo: str, procesos=None, opciones=None):
         super().__init__()
+        self.setAutoDelete(False)  # La ventana conserva la tarea mientras la necesita
+        self.fila = fila
         self.ruta_archivo = ruta_archivo
+        self.procesos = procesos
+        self.opciones = opciones or {}
+        self.cancelacion = threading.Event()
+        self.senales = SenalesTarea()
+
+    def cancelar(self):
+        # Se llama desde el hilo de la interfaz: el evento es seguro entre hilos
+        self.cancelacion.set()
 
-    def ejecutar_trabajo(self):
+    def run(self):
+        opciones = dict(self.opciones)
+        if self.procesos is not None: opciones["procesos"] = self.procesos
         try:
-            texto_bruto = extraer_texto(self.ruta_archivo, lambda p: self.progreso_actualizado.emit(p))
-            if texto_bruto.startswith("Error:"): raise ValueError(texto_bruto)
-            texto_limpio = limpiar_y_estructurar_texto(texto_bruto)
-            self.trabajo_terminado.emit(texto_limpio)
+            texto_limpio = procesar_documento(self.ruta_archivo, lambda p: self.senales.progreso_actualizado.emit(self.fila, p),
+                                              cache=CACHE_RESULTADOS, cache_partes=CACHE_PARTES,
+                                              cancelacion=self.cancelacion, **opciones)
+            # Los contadores se calculan aquí, fuera del hilo de la interfaz
+            self.senales.trabajo_terminado.emit(self.fila, texto_limpio, len(texto_limpio.split()), len(texto_limpio))
+        except ExtraccionCancelada:
+            self.senales.trabajo_cancelado.emit(self.fila)
         except Exception as e:
-            self.error_ocurrido.emit(str(e))
+            self.senales.error_ocurrido.emit(self.fila, str(e))
+
+def expandir_rutas(rutas):
+    """Devuelve los archivos indicados y los documentos soportados de las carpetas indicadas."""
+    archivos = []
+    for ruta in map(Path, rutas):
+        if ruta.is_dir():
+            archivos += sorted(p for p in ruta.rglob("*") if p.is_file() and p.suffix.lower() in EXTRACTORES)
+        elif ruta.is_file():
+            archivos.append(ruta)
+    return archivos
 
 # --- Widgets Personalizados ---
+class VisorTexto(QPlainTextEdit):
+    """
+    Visor de solo lectura para resultados muy largos: muestra el texto por bloques y
+    añade el siguiente al acercarse al final del desplazamiento, en lugar de cargar el
+    documento entero de una vez. El texto completo sigue en el buffer de resultados.
+    """
+    CARACTERES_BLOQUE = 200_000
+
+    def __init__(self):
+        super().__init__()
+        self.setReadOnly(True)
+        self.setUndoRedoEnabled(False)
+        self._texto = ""; self._mostrado = 0
+        self.verticalScrollBar().valueChanged.connect(self._al_desplazar)
+
+    def mostrar(self, texto):
+        self._texto = texto; self._mostrado = 0
+        self.clear()
+        self._cargar_bloque()
+
+    def _cargar_bloque(self):
+        if self._mostrado >= len(self._texto): return
+        fin = self._texto.find("\n", self._mostrado + self.CARACTERES_BLOQUE)
+        fin = len(self._texto) if fin == -1 else fin + 1
+        barra = self.verticalScrollBar(); posicion = barra.value()
+        cursor = QTextCursor(self.document()); cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(self._texto[self._mostrado:fin])
+        self._mostrado = fin
+        barra.setValue(posicion)
+
+    def _al_desplazar(self, valor):
+        barra = self.verticalScrollBar()
+        if valor >= barra.maximum() - barra.pageStep():
+            self._cargar_bloque()
+
 class DropZone(QFrame):
-    archivo_soltado = Signal(str)
+    archivos_soltados = Signal(list)
     def __init__(self):
         super().__init__(); self.setAcceptDrops(True)
         self.setStyleSheet(f"background-color: {StyleConfig.COLOR_BACKGROUND_LIGHT}; border-radius: 5px;")
@@ -141,8 +238,8 @@ class DropZone(QFrame):
     def dropEvent(self, event):
         self.setStyleSheet(f"background-color: {StyleConfig.COLOR_BACKGROUND_LIGHT}; border-radius: 5px;")
         if event.mimeData().hasUrls():
-            ruta = event.mimeData().urls()[0].toLocalFile()
-            if Path(ruta).is_file(): self.archivo_soltado.emit(ruta)
+            archivos = expandir_rutas(url.toLocalFile() for url in event.mimeData().urls())
+            if archivos: self.archivos_soltados.emit([str(a) for a in archivos])
 
 class WelcomeDialog(QDialog):
     def __init__(self, lang, parent=None):
@@ -156,17 +253,27 @@ class WelcomeDialog(QDialog):
 
 # --- Ventana Principal de la Aplicación ---
 class VentanaPrincipal(QWidget):
+    # Columnas de la tabla de la cola
+    COL_ARCHIVO, COL_ESTADO, COL_PROGRESO = range(3)
+
     def __init__(self):
         super().__init__()
         settings = load_settings()
         self.current_lang = settings.get('language', 'es')
-        self.ruta_archivo_original = None
+        # Estado de la cola, indexado por fila de la tabla
+        self.rutas = []; self.estados = []; self.tareas = {}; self.resultados = {}; self.conteos = {}
+
+        # Un hilo por núcleo: los documentos de la cola se procesan a la vez
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(os.cpu_count() or 1)
 
         self._init_ui()
         self._connect_signals()
         self.actualizar_ui_textos()
         if (index := self.selector_idioma.findData(self.current_lang)) != -1:
             self.selector_idioma.setCurrentIndex(index)
+        if (index := self.selector_calidad_pdf.findData(settings.get('pdf_quality'))) != -1:
+            self.selector_calidad_pdf.setCurrentIndex(index)
 
     def _init_ui(self):
         layout_principal = QVBoxLayout(self)
@@ -180,13 +287,21 @@ class VentanaPrincipal(QWidget):
         self.boton_guardar = QPushButton()
         self.boton_guardar.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_DialogSaveButton))
         self.boton_guardar.setEnabled(False)
+        self.boton_guardar_todo = QPushButton()
+        self.boton_guardar_todo.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_DirIcon))
+        self.boton_guardar_todo.setEnabled(False)
+        self.boton_cancelar = QPushButton()
+        self.boton_cancelar.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_DialogCancelButton))
+        self.boton_cancelar.setVisible(False)
         
         layout_botones = QHBoxLayout()
         layout_botones.addWidget(self.boton_examinar)
+        layout_botones.addWidget(self.boton_cancelar)
         layout_botones.addStretch()
         layout_botones.addWidget(self.boton_guardar)
+        layout_botones.addWidget(self.boton_guardar_todo)
 
-        # --- Barra de Progreso y Estado ---
+        # --- Barra de Progreso y Estado (progreso global de la cola) ---
         self.barra_progreso = QProgressBar()
         self.barra_progreso.setVisible(False)
         self.status_label = QLabel()
@@ -195,9 +310,16 @@ class VentanaPrincipal(QWidget):
         layout_estado.addWidget(self.status_label, 1)
         layout_estado.addWidget(self.barra_progreso)
 
-        # --- Área de Texto Principal ---
-        self.texto_resultado = QTextEdit()
-        self.texto_resultado.setReadOnly(True)
+        # --- Cola de documentos (un documento por fila, con su estado y progreso) ---
+        self.tabla_cola = QTableWidget(0, 3)
+        self.tabla_cola.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.tabla_cola.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.tabla_cola.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.tabla_cola.verticalHeader().setVisible(False)
+        self.tabla_cola.horizontalHeader().setSectionResizeMode(self.COL_ARCHIVO, QHeaderView.ResizeMode.Stretch)
+
+        # --- Área de Texto Principal (resultado del documento seleccionado) ---
+        self.texto_resultado = VisorTexto()
 
         # --- Zona Inferior (Contadores, Idioma y Branding) ---
         self.contador_palabras = QLabel()
@@ -205,9 +327,19 @@ class VentanaPrincipal(QWidget):
         self.selector_idioma = QComboBox()
         self.selector_idioma.addItem("Español", "es")
         self.selector_idioma.addItem("English", "en")
+        # Opciones de PDF: calidad rápida para triaje y selección de páginas
+        self.selector_calidad_pdf = QComboBox()
+        for calidad in CALIDADES_PDF: self.selector_calidad_pdf.addItem("", calidad)
+        self.campo_paginas = QLineEdit()
+        self.campo_paginas.setMaximumWidth(170)
+        self.max_paginas = QSpinBox()
+        self.max_paginas.setRange(0, 100_000)  # 0 = todas
         
         layout_inferior = QHBoxLayout()
         layout_inferior.addWidget(self.selector_idioma)
+        layout_inferior.addWidget(self.selector_calidad_pdf)
+        layout_inferior.addWidget(self.campo_paginas)
+        layout_inferior.addWidget(self.max_paginas)
         layout_inferior.addStretch()
         layout_inferior.addWidget(self.contador_palabras)
         layout_inferior.addWidget(self.contador_caracteres)
@@ -216,15 +348,19 @@ class VentanaPrincipal(QWidget):
         layout_principal.addWidget(self.drop_zone, 1)
         layout_principal.addLayout(layout_botones)
         layout_principal.addLayout(layout_estado)
+        layout_principal.addWidget(self.tabla_cola, 2)
         layout_principal.addWidget(self.texto_resultado, 3)
         layout_principal.addLayout(layout_inferior)
 
     def _connect_signals(self):
-        self.drop_zone.archivo_soltado.connect(self.iniciar_procesamiento)
+        self.drop_zone.archivos_soltados.connect(self.iniciar_procesamiento)
         self.boton_examinar.clicked.connect(self.abrir_dialogo_archivo)
         self.boton_guardar.clicked.connect(self.guardar_resultado)
+        self.boton_guardar_todo.clicked.connect(self.guardar_todos)
+        self.boton_cancelar.clicked.connect(self.cancelar_procesamiento)
+        self.tabla_cola.itemSelectionChanged.connect(self.mostrar_seleccionado)
         self.selector_idioma.currentIndexChanged.connect(self.cambiar_idioma)
-        self.texto_resultado.textChanged.connect(self.actualizar_contadores)
+        self.selector_calidad_pdf.currentIndexChanged.connect(self.cambiar_calidad_pdf)
 
     def showEvent(self, event):
         super().showEvent(event)
@@ -236,13 +372,29 @@ class VentanaPrincipal(QWidget):
                 if dialog.exec() and dialog.checkbox.isChecked():
                     settings["show_welcome"] = False; save_settings(settings)
 
+    def closeEvent(self, event):
+        # Las tareas en curso se cancelan para no bloquear el cierre esperando al pool
+        for tarea in self.tareas.values(): tarea.cancelar()
+        self.pool.waitForDone()
+        super().closeEvent(event)
+
     def actualizar_ui_textos(self):
         tr = TRANSLATIONS[self.current_lang]
         self.setWindowTitle(tr["window_title"])
         self.drop_zone.label.setText(tr["drop_zone_label"])
         self.boton_examinar.setText(tr["select_file_button"])
         self.boton_guardar.setText(tr["save_result_button"])
-        self.set_status(tr["status_waiting"])
+        self.boton_guardar_todo.setText(tr["save_all_button"])
+        self.boton_cancelar.setText(tr["cancel_button"])
+        self.tabla_cola.setHorizontalHeaderLabels([tr["queue_file"], tr["queue_status"], tr["queue_progress"]])
+        for i in range(self.selector_calidad_pdf.count()):
+            self.selector_calidad_pdf.setItemText(i, tr[f"pdf_quality_{self.selector_calidad_pdf.itemData(i)}"])
+        self.campo_paginas.setPlaceholderText(tr["pdf_pages_placeholder"])
+        self.max_paginas.setPrefix(tr["pdf_max_pages"]); self.max_paginas.setSpecialValueText(tr["pdf_all_pages"])
+        for fila, estado in enumerate(self.estados):
+            self.tabla_cola.item(fila, self.COL_ESTADO).setText(tr[estado])
+        if self.estados: self.actualizar_estado_cola()
+        else: self.set_status(tr["status_waiting"])
         self.actualizar_contadores()
 
     def cambiar_idioma(self):
@@ -250,11 +402,22 @@ class VentanaPrincipal(QWidget):
         self.actualizar_ui_textos()
         settings = load_settings(); settings['language'] = self.current_lang; save_settings(settings)
     
+    def cambiar_calidad_pdf(self):
+        settings = load_settings(); settings['pdf_quality'] = self.selector_calidad_pdf.currentData(); save_settings(settings)
+
+    def opciones_pdf(self):
+        """Opciones de PDF elegidas (solo las distintas del valor por defecto). ValueError si el rango no es válido."""
+        opciones = {}
+        if self.selector_calidad_pdf.currentData() != 'completa': opciones["calidad_pdf"] = self.selector_calidad_pdf.currentData()
+        if paginas := self.campo_paginas.text().strip():
+            analizar_rango_paginas(paginas); opciones["paginas"] = paginas
+        if self.max_paginas.value(): opciones["max_paginas"] = self.max_paginas.value()
+        return opciones
+
     def actualizar_contadores(self):
+        # Los contadores llegan calculados desde la tarea; no se recorre el texto del visor
         tr = TRANSLATIONS[self.current_lang]
-        texto = self.texto_resultado.toPlainText()
-        num_palabras = len(texto.split()) if texto else 0
-        num_caracteres = len(texto)
+        num_palabras, num_caracteres = self.conteos.get(self.tabla_cola.currentRow(), (0, 0))
         self.contador_palabras.setText(tr["word_count_label"].format(count=num_palabras))
         self.contador_caracteres.setText(tr["char_count_label"].format(count=num_caracteres))
 
@@ -262,41 +425,107 @@ class VentanaPrincipal(QWidget):
         tr = TRANSLATIONS[self.current_lang]
         filtro_documentos = f"{tr.get('supported_files', 'Supported Documents')} (*{formatos_filtro_str})"
         filtro_todos = f"{tr.get('all_files', 'All Files')} (*)"
-        ruta, _ = QFileDialog.getOpenFileName(self, tr.get('dialog_select_file', 'Select file'), "", f"{filtro_documentos};;{filtro_todos}")
-        if ruta: self.iniciar_procesamiento(ruta)
-
-    def iniciar_procesamiento(self, ruta_archivo):
-        self.ruta_archivo_original = Path(ruta_archivo)
-        self.boton_examinar.setEnabled(False); self.boton_guardar.setEnabled(False)
-        self.set_status(TRANSLATIONS[self.current_lang]["status_processing"].format(filename=self.ruta_archivo_original.name))
-        self.texto_resultado.clear()
-        self.barra_progreso.setValue(0); self.barra_progreso.setVisible(True)
-
-        self.thread = QThread()
-        self.worker = ParserWorker(ruta_archivo)
-        self.worker.moveToThread(self.thread)
-        self.worker.progreso_actualizado.connect(self.barra_progreso.setValue)
-        self.thread.started.connect(self.worker.ejecutar_trabajo)
-        self.worker.trabajo_terminado.connect(self.manejar_resultado_exitoso)
-        self.worker.error_ocurrido.connect(self.manejar_error)
-        self.thread.finished.connect(self.thread.deleteLater)
-        self.worker.trabajo_terminado.connect(self.thread.quit)
-        self.worker.error_ocurrido.connect(self.thread.quit)
-        self.thread.start()
-
-    def manejar_resultado_exitoso(self, texto_limpio):
-        self.barra_progreso.setVisible(False)
-        self.texto_resultado.setText(texto_limpio)
-        self.set_status(TRANSLATIONS[self.current_lang]["status_success"], "success")
-        self.boton_examinar.setEnabled(True); self.boton_guardar.setEnabled(True)
+        rutas, _ = QFileDialog.getOpenFileNames(self, tr.get('dialog_select_file', 'Select file'), "", f"{filtro_documentos};;{filtro_todos}")
+        if rutas: self.iniciar_procesamiento(rutas)
+
+    # --- Cola de procesamiento ---
+
+    def iniciar_procesamiento(self, rutas_archivos):
+        """Añade los archivos a la cola y los envía al pool de hilos."""
+        tr = TRANSLATIONS[self.current_lang]
+        if isinstance(rutas_archivos, str): rutas_archivos = [rutas_archivos]
+        try:
+            opciones = self.opciones_pdf()
+        except ValueError as e:
+            self.manejar_error(e); return
+        # Con varios documentos a la vez, cada PDF se extrae en serie: el paralelismo ya
+        # lo da la cola y así no se lanzan procesos por cada documento
+        procesos = 1 if len(rutas_archivos) > 1 or self.tareas else None
+        for ruta in rutas_archivos:
+            fila = self.tabla_cola.rowCount()
+            self.tabla_cola.insertRow(fila)
+            self.rutas.append(Path(ruta)); self.estados.append("job_queued")
+            item_archivo = QTableWidgetItem(Path(ruta).name); item_archivo.setToolTip(str(ruta))
+            self.tabla_cola.setItem(fila, self.COL_ARCHIVO, item_archivo)
+            self.tabla_cola.setItem(fila, self.COL_ESTADO, QTableWidgetItem(tr["job_queued"]))
+            barra = QProgressBar(); barra.setValue(0)
+            self.tabla_cola.setCellWidget(fila, self.COL_PROGRESO, barra)
+
+            tarea = TareaDocumento(fila, str(ruta), procesos, opciones if Path(ruta).suffix.lower() == '.pdf' else None)
+            tarea.senales.progreso_actualizado.connect(self.actualizar_progreso)
+            tarea.senales.trabajo_terminado.connect(self.manejar_resultado_exitoso)
+            tarea.senales.error_ocurrido.connect(self.manejar_error_tarea)
+            tarea.senales.trabajo_cancelado.connect(self.manejar_cancelacion)
+            self.tareas[fila] = tarea
+            self.pool.start(tarea)
+        self.barra_progreso.setVisible(True)
+        self.boton_cancelar.setEnabled(True); self.boton_cancelar.setVisible(True)
+        self.actualizar_estado_cola()
+        if not self.tabla_cola.selectedItems(): self.tabla_cola.selectRow(self.tabla_cola.rowCount() - len(rutas_archivos))
+
+    def actualizar_progreso(self, fila, progreso):
+        if self.estados[fila] == "job_queued": self._cambiar_estado(fila, "job_processing")
+        self.tabla_cola.cellWidget(fila, self.COL_PROGRESO).setValue(progreso)
+        self.actualizar_estado_cola()
+
+    def _cambiar_estado(self, fila, estado, detalle=None):
+        self.estados[fila] = estado
+        item = self.tabla_cola.item(fila, self.COL_ESTADO)
+        item.setText(TRANSLATIONS[self.current_lang][estado])
+        if detalle: item.setToolTip(detalle)
+
+    def _terminar_tarea(self, fila, estado, detalle=None):
+        self.tareas.pop(fila, None)
+        self._cambiar_estado(fila, estado, detalle)
+        if estado == "job_done": self.tabla_cola.cellWidget(fila, self.COL_PROGRESO).setValue(100)
+        self.actualizar_estado_cola()
+
+    def actualizar_estado_cola(self):
+        """Actualiza el texto de estado, la barra global y los botones según la cola."""
+        tr = TRANSLATIONS[self.current_lang]
+        total = len(self.estados)
+        progreso_total = sum(100 if e != "job_processing" and e != "job_queued" else self.tabla_cola.cellWidget(f, self.COL_PROGRESO).value()
+                             for f, e in enumerate(self.estados))
+        self.barra_progreso.setValue(int(progreso_total / total) if total else 0)
+        completados = self.estados.count("job_done"); errores = self.estados.count("job_error")
+        if self.tareas:
+            self.set_status(tr["status_queue"].format(done=total - len(self.tareas), total=total))
+        else:
+            self.barra_progreso.setVisible(False); self.boton_cancelar.setVisible(False)
+            self.set_status(tr["status_queue_done"].format(ok=completados, errors=errores), "error" if errores else "success")
+        self.boton_guardar_todo.setEnabled(bool(self.resultados))
+
+    def cancelar_procesamiento(self):
+        # Cada extracción se detiene en su siguiente página/unidad; las pendientes, al empezar
+        self.boton_cancelar.setEnabled(False)
+        for tarea in self.tareas.values(): tarea.cancelar()
+
+    def manejar_cancelacion(self, fila):
+        self._terminar_tarea(fila, "job_cancelled")
+
+    def manejar_resultado_exitoso(self, fila, texto_limpio, num_palabras, num_caracteres):
+        self.resultados[fila] = texto_limpio
+        self.conteos[fila] = (num_palabras, num_caracteres)
+        self._terminar_tarea(fila, "job_done")
+        if self.tabla_cola.currentRow() == fila: self.mostrar_seleccionado()
+
+    def manejar_error_tarea(self, fila, mensaje_error):
+        self._terminar_tarea(fila, "job_error", mensaje_error)
+        if self.tabla_cola.currentRow() == fila: self.mostrar_seleccionado()
+
+    def mostrar_seleccionado(self):
+        """Muestra el resultado (o el error) del documento seleccionado en la cola."""
+        fila = self.tabla_cola.currentRow()
+        texto = self.resultados.get(fila, "")
+        if not texto and 0 <= fila < len(self.estados) and self.estados[fila] == "job_error":
+            texto = self.tabla_cola.item(fila, self.COL_ESTADO).toolTip()
+        self.texto_resultado.mostrar(texto)
+        self.actualizar_contadores()
+        self.boton_guardar.setEnabled(fila in self.resultados)
 
     def manejar_error(self, mensaje_error):
         tr = TRANSLATIONS[self.current_lang]
-        self.barra_progreso.setVisible(False)
         QMessageBox.critical(self, tr["error_dialog_title"], str(mensaje_error))
-        self.set_status(tr["status_waiting"], "error")
-        self.boton_examinar.setEnabled(True)
-        self.boton_guardar.setEnabled(False)
 
     def set_status(self, texto, tipo="subtle"):
         self.status_label.setText(texto)
@@ -306,10 +535,12 @@ class VentanaPrincipal(QWidget):
         self.status_label.setStyleSheet(f"color: {color};")
 
     def guardar_resultado(self):
-        texto_a_guardar = self.texto_resultado.toPlainText()
+        # Se guarda desde el buffer de resultados, no desde el visor (que puede estar a medio cargar)
+        fila = self.tabla_cola.currentRow()
+        texto_a_guardar = self.resultados.get(fila)
         if not texto_a_guardar: return
         
-        nombre_sugerido = f"{self.ruta_archivo_original.stem}_procesado.txt"
+        nombre_sugerido = f"{self.rutas[fila].stem}_procesado.txt"
         ruta_guardar, _ = QFileDialog.getSaveFileName(self, "Guardar Resultado", nombre_sugerido, "Archivos de Texto (*.txt)")
         
         if ruta_guardar:
@@ -319,7 +550,28 @@ class VentanaPrincipal(QWidget):
             except Exception as e:
                 self.manejar_error(f"No se pudo guardar el archivo: {e}")
 
+    def guardar_todos(self):
+        """Guarda todos los resultados completados en una carpeta, como <nombre>_procesado.txt."""
+        tr = TRANSLATIONS[self.current_lang]
+        if not self.resultados: return
+        carpeta = QFileDialog.getExistingDirectory(self, tr["dialog_save_folder"])
+        if not carpeta: return
+        usados = set()
+        try:
+            for fila, texto in sorted(self.resultados.items()):
+                nombre = f"{self.rutas[fila].stem}_procesado"
+                destino = Path(carpeta) / f"{nombre}.txt"; n = 2
+                # Documentos con el mismo nombre en carpetas distintas no se sobrescriben entre sí
+                while destino in usados:
+                    destino = Path(carpeta) / f"{nombre}_{n}.txt"; n += 1
+                usados.add(destino)
+                destino.write_text(texto, encoding='utf-8')
+            self.set_status(tr["status_saved_all"].format(count=len(usados), path=carpeta), "success")
+        except Exception as e:
+            self.manejar_error(f"No se pudo guardar el archivo: {e}")
+
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Necesario para el pool de procesos en el ejecutable de PyInstaller
     app = QApplication(sys.argv)
     app.setStyleSheet(APP_STYLESHEET)
     ventana = VentanaPrincipal()
@@ -0,0 +1,190 @@
+# src/metricas.py
+import cProfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+# Límites superiores (le) de los histogramas; el tramo +Inf se añade al exportar
+CUBETAS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+CUBETAS_BYTES = tuple(2 ** n * 1024 * 1024 for n in range(0, 11))  # 1 MB .. 1 GB
+
+# Tramos de tamaño de archivo usados como etiqueta (límite superior, nombre)
+TRAMOS_TAMANO = ((100 * 1024, "<100KB"), (1024 * 1024, "<1MB"), (10 * 1024 * 1024, "<10MB"),
+                 (100 * 1024 * 1024, "<100MB"))
+
+
+def tramo_tamano(tamano_bytes) -> str:
+    """Agrupa un tamaño en bytes en un tramo con pocas etiquetas distintas."""
+    if tamano_bytes is None:
+        return "desconocido"
+    for limite, nombre in TRAMOS_TAMANO:
+        if tamano_bytes < limite:
+            return nombre
+    return ">=100MB"
+
+
+class _Histograma:
+    def __init__(self, cubetas):
+        self.cubetas = cubetas
+        self.conteos = [0] * len(cubetas)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.suma += valor
+        self.total += 1
+        for i, limite in enumerate(self.cubetas):
+            if valor <= limite:
+                self.conteos[i] += 1
+                break
+
+
+class RegistroMetricas:
+    """
+    Acumula la duración y el pico de memoria de cada etapa del procesamiento
+    (recepción, caché, extracción, limpieza, serialización...) etiquetados por
+    extensión y tramo de tamaño, y los exporta en el formato de texto de Prometheus.
+
+    El pico de memoria se mide con tracemalloc, que ralentiza el intérprete, por lo
+    que solo se activa con medir_memoria=True. Con etapas concurrentes en varios hilos
+    el pico atribuido a cada una es aproximado, porque tracemalloc es global.
+    """
+
+    def __init__(self, prefijo="dissentis", medir_memoria=False):
+        self.prefijo = prefijo
+        self.medir_memoria = medir_memoria
+        self._duraciones = {}
+        self._memoria = {}
+        self._contadores = {}
+        self._indicadores = []
+        self._lock = threading.Lock()
+        if medir_memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    # --- Registro ---
+
+    @contextmanager
+    def etapa(self, nombre, extension="", tamano_bytes=None):
+        """Mide la duración (y, si está activado, el pico de memoria) del bloque."""
+        memoria_inicial = None
+        if self.medir_memoria and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            memoria_inicial = tracemalloc.get_traced_memory()[0]
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            pico = None
+            if memoria_inicial is not None:
+                pico = max(tracemalloc.get_traced_memory()[1] - memoria_inicial, 0)
+            self.observar(nombre, time.perf_counter() - inicio, pico, extension, tamano_bytes)
+
+    def observar(self, nombre, segundos, pico_bytes=None, extension="", tamano_bytes=None):
+        """Registra una medición ya tomada (para etapas que no son un bloque contiguo)."""
+        etiquetas = (("etapa", nombre), ("extension", extension.lower()), ("tamano", tramo_tamano(tamano_bytes)))
+        with self._lock:
+            self._duraciones.setdefault(etiquetas, _Histograma(CUBETAS_SEGUNDOS)).observar(segundos)
+            if pico_bytes is not None:
+                self._memoria.setdefault(etiquetas, _Histograma(CUBETAS_BYTES)).observar(pico_bytes)
+
+    def contar(self, nombre, **etiquetas):
+        """Incrementa el contador <prefijo>_<nombre>_total con las etiquetas dadas."""
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + 1
+
+    def registrar_indicador(self, nombre, ayuda, funcion):
+        """Añade un valor instantáneo (gauge) que se calcula con funcion() al exportar."""
+        self._indicadores.append((nombre, ayuda, funcion))
+
+    # --- Exportación ---
+
+    def exportar(self) -> str:
+        """Devuelve todas las métricas en el formato de texto de Prometheus (0.0.4)."""
+        lineas = []
+        with self._lock:
+            self._exportar_histogramas(lineas, "etapa_duracion_segundos",
+                                       "Duración de cada etapa del procesamiento", self._duraciones)
+            self._exportar_histogramas(lineas, "etapa_memoria_pico_bytes",
+                                       "Pico de memoria de Python asignada en cada etapa", self._memoria)
+            nombres = sorted({nombre for nombre, _ in self._contadores})
+            for nombre in nombres:
+                metrica = f"{self.prefijo}_{nombre}_total"
+                lineas += [f"# TYPE {metrica} counter"]
+                for (n, etiquetas), valor in sorted(self._contadores.items()):
+                    if n == nombre:
+                        lineas.append(f"{metrica}{_etiquetas(etiquetas)} {valor}")
+        for nombre, ayuda, funcion in self._indicadores:
+            metrica = f"{self.prefijo}_{nombre}"
+            lineas += [f"# HELP {metrica} {ayuda}", f"# TYPE {metrica} gauge", f"{metrica} {funcion()}"]
+        return "\n".join(lineas) + "\n"
+
+    def _exportar_histogramas(self, lineas, nombre, ayuda, histogramas):
+        if not histogramas:
+            return
+        metrica = f"{self.prefijo}_{nombre}"
+        lineas += [f"# HELP {metrica} {ayuda}", f"# TYPE {metrica} histogram"]
+        for etiquetas, h in sorted(histogramas.items()):
+            acumulado = 0
+            for limite, conteo in zip(h.cubetas, h.conteos):
+                acumulado += conteo
+                lineas.append(f"{metrica}_bucket{_etiquetas(etiquetas + (('le', _numero(limite)),))} {acumulado}")
+            lineas.append(f"{metrica}_bucket{_etiquetas(etiquetas + (('le', '+Inf'),))} {h.total}")
+            lineas.append(f"{metrica}_sum{_etiquetas(etiquetas)} {_numero(h.suma)}")
+            lineas.append(f"{metrica}_count{_etiquetas(etiquetas)} {h.total}")
+
+
+def _etiquetas(pares) -> str:
+    if not pares:
+        return ""
+    escapar = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in pares) + "}"
+
+def _numero(valor) -> str:
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+# --- Perfilado de peticiones lentas ---
+
+# cProfile solo admite un perfilador activo a la vez: las peticiones concurrentes no se perfilan
+_perfil_en_uso = threading.Lock()
+
+@contextmanager
+def perfilar_si_lenta(nombre, umbral_segundos, directorio):
+    """
+    Perfila el bloque con cProfile y, si tarda al menos umbral_segundos, guarda el
+    perfil en directorio/<marca de tiempo>_<nombre>.prof (legible con pstats o snakeviz).
+    Con umbral_segundos None el bloque se ejecuta sin perfilar.
+    """
+    if umbral_segundos is None or not _perfil_en_uso.acquire(blocking=False):
+        yield
+        return
+    perfil = cProfile.Profile()
+    inicio = time.perf_counter()
+    try:
+        try:
+            perfil.enable()
+        except ValueError:  # Otra herramienta de perfilado ya está activa
+            perfil = None
+        yield
+    finally:
+        if perfil is not None:
+            perfil.disable()
+            duracion = time.perf_counter() - inicio
+            if duracion >= umbral_segundos:
+                destino = Path(directorio)
+                destino.mkdir(parents=True, exist_ok=True)
+                marca = time.strftime("%Y%m%d-%H%M%S")
+                perfil.dump_stats(destino / f"{marca}_{duracion:.1f}s_{nombre}.prof")
+        _perfil_en_uso.release()
+
+def ejecutar_perfilada(nombre, umbral_segundos, directorio, funcion, *args, **kwargs):
+    """
+    Ejecuta funcion(*args, **kwargs) dentro de perfilar_si_lenta en el hilo o proceso
+    donde se llama, de modo que el perfil recoge el trabajo y no la espera de quien la
+    envió a un pool. Es una función de módulo: se puede enviar a un pool de procesos.
+    """
+    with perfilar_si_lenta(nombre, umbral_segundos, directorio):
+        return funcion(*args, **kwargs)
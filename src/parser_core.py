@@ -4,171 +4,1597 @@ from pathlib import Path
 import json
 import csv
 import warnings
+import os
+import io
+import shutil
+import tempfile
+import hashlib
+import importlib
+import time
+import itertools
+import multiprocessing
+import threading
+import zipfile
+import zlib
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from importlib.metadata import entry_points
 
-# Librerías de terceros
-import pdfplumber
-import docx
-from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
-import pptx
-import openpyxl
-from odf import text, teletype
-from odf.opendocument import load as load_odt
-from striprtf.striprtf import rtf_to_text
-from ebooklib import epub, ITEM_DOCUMENT
-from markdown import markdown
+# Las librerías de terceros de cada formato (pdfplumber, python-docx, bs4...) se importan
+# dentro de su extractor, la primera vez que se procesa un archivo de ese formato.
 
 # --- FUNCIONES DE PROCESAMIENTO DE TEXTO ---
 
-def limpiar_y_estructurar_texto(texto_bruto: str) -> str:
+# Versión del motor de limpieza: incrementarla al cambiar su lógica invalida la caché
+VERSION_LIMPIEZA = "4"
+
+# Patrones de ruido a eliminar por defecto (cabeceras, pies de página, etc.)
+PATRONES_RUIDO = (
+    r'copyright', r'todos los derechos reservados', r'aviso legal',
+    r'política de privacidad', r'agencia de traducción', r'traducciones profesionales',
+    r'ibidem group', r'contacto', r'icono cabecera'
+)
+
+# Patrones para identificar elementos estructurales (compilados una sola vez)
+_PATRON_CODIGO = re.compile(r'^\s*(?:>>>|\$|#|~|\.\.\.)\s')
+# Título en mayúsculas (5 a 50 chars) o elemento de lista, clasificados en una única búsqueda
+_PATRON_ESTRUCTURA = re.compile(
+    r'(?P<titulo>^\s*[A-Z\s]{5,50}\s*$)|(?P<lista>^\s*[-*•]\s+|^\s*\d+\.\s+)'
+)
+_VINETAS = '-*•'
+
+
+class ReglasLimpieza:
+    """
+    Conjunto de reglas de limpieza compiladas. Todos los patrones de ruido se
+    combinan en una única expresión regular para evaluar cada línea una sola vez.
+    """
+
+    def __init__(self, patrones_ruido=PATRONES_RUIDO):
+        self.patrones_ruido = tuple(patrones_ruido)
+        if self.patrones_ruido:
+            combinado = "|".join(f"(?:{p})" for p in self.patrones_ruido)
+            self._ruido = re.compile(combinado, re.IGNORECASE)
+        else:
+            self._ruido = None
+        # Huella que identifica el conjunto de reglas (se usa en las claves de caché)
+        contenido = "\x00".join((VERSION_LIMPIEZA, _PATRON_CODIGO.pattern, _PATRON_ESTRUCTURA.pattern)
+                                 + self.patrones_ruido)
+        self.huella = hashlib.sha256(contenido.encode('utf-8')).hexdigest()[:16]
+
+    def es_ruido(self, linea_limpia: str) -> bool:
+        if not linea_limpia or linea_limpia.isdigit():
+            return True
+        return self._ruido is not None and self._ruido.search(linea_limpia) is not None
+
+    def limpiar(self, lineas):
+        """
+        Generador que recorre las líneas una sola vez y produce los fragmentos del
+        Markdown final. La normalización de líneas en blanco (antes cuatro pasadas
+        de re.sub sobre el texto completo) se resuelve aquí al unir cada segmento
+        con el anterior, reproduciendo exactamente el resultado anterior.
+        """
+        en_codigo = False
+        # Estado del segmento anterior: contenido, saltos finales propios y si
+        # su línea en blanco posterior ya quedó normalizada como título.
+        anterior = None
+        saltos_anterior = 0
+        titulo_anterior = False
+
+        def unir(segmento, saltos_previos=0, saltos_posteriores=0):
+            nonlocal anterior, saltos_anterior, titulo_anterior
+            if anterior is None:
+                # El inicio del texto se recorta (equivale al strip() final)
+                fragmento = segmento
+                es_titulo = False
+            else:
+                saltos = min(saltos_anterior + 1 + saltos_previos, 2)
+                if titulo_anterior:
+                    saltos = 2
+                if segmento.startswith('```'):
+                    saltos += 1
+                if anterior.endswith('```'):
+                    saltos += 1
+                fragmento = "\n" * saltos + segmento
+                es_titulo = segmento.startswith('## ') and not titulo_anterior
+            anterior, saltos_anterior, titulo_anterior = segmento, saltos_posteriores, es_titulo
+            return fragmento
+
+        for linea in lineas:
+            linea_limpia = linea.strip()
+
+            if self.es_ruido(linea_limpia):
+                continue
+
+            if _PATRON_CODIGO.match(linea):
+                if not en_codigo:
+                    yield unir("```python", saltos_previos=1)
+                    en_codigo = True
+                yield unir(linea)
+                continue
+            elif en_codigo:
+                yield unir("```", saltos_posteriores=1)
+                en_codigo = False
+
+            estructura = _PATRON_ESTRUCTURA.match(linea_limpia)
+            if estructura and estructura.lastgroup == 'titulo':
+                if len(linea_limpia.split()) < 10:
+                    yield unir(f"## {linea_limpia}", saltos_posteriores=1)
+                    continue
+            elif estructura and linea_limpia[0] in _VINETAS:
+                yield unir('-' + linea_limpia[1:])
+                continue
+
+            yield unir(linea_limpia)
+
+        if en_codigo:
+            yield unir("```", saltos_posteriores=1)
+
+
+@lru_cache(maxsize=32)
+def _compilar_reglas(patrones_ruido: tuple) -> ReglasLimpieza:
+    return ReglasLimpieza(patrones_ruido)
+
+
+def obtener_reglas(patrones_ruido=None) -> ReglasLimpieza:
+    """
+    Devuelve las reglas compiladas para una lista de patrones de ruido. Las
+    compilaciones se cachean, de modo que repetir la misma lista no tiene coste.
+    """
+    if patrones_ruido is None:
+        return REGLAS_POR_DEFECTO
+    return _compilar_reglas(tuple(patrones_ruido))
+
+
+REGLAS_POR_DEFECTO = _compilar_reglas(PATRONES_RUIDO)
+
+
+def limpiar_y_estructurar_texto(texto_bruto: str, patrones_ruido=None) -> str:
     """
     Toma el texto en bruto y aplica reglas de limpieza y estructuración a Markdown.
+    Opcionalmente acepta una lista propia de patrones de ruido.
     """
-    # Patrones de ruido a eliminar (cabeceras, pies de página, etc.)
-    noise_patterns = [
-        r'copyright', r'todos los derechos reservados', r'aviso legal',
-        r'política de privacidad', r'agencia de traducción', r'traducciones profesionales',
-        r'ibidem group', r'contacto', r'icono cabecera'
-    ]
-    
-    # Patrones para identificar elementos estructurales
-    code_prompt_pattern = re.compile(r'^\s*(?:>>>|\$|#|~|\.\.\.)\s')
-    title_pattern = re.compile(r'^\s*[A-Z\s]{5,50}\s*$') # Títulos en mayúsculas (5 a 50 chars)
-    list_item_pattern = re.compile(r'^\s*[-*•]\s+|^\s*\d+\.\s+')
-
-    lineas_originales = texto_bruto.split('\n')
-    lineas_procesadas = []
-    
-    in_code_block = False
-
-    for linea in lineas_originales:
-        linea_limpia = linea.strip()
-
-        if not linea_limpia or any(re.search(p, linea_limpia, re.IGNORECASE) for p in noise_patterns) or linea_limpia.isdigit():
-            continue
+    reglas = obtener_reglas(patrones_ruido)
+    return "".join(reglas.limpiar(texto_bruto.split('\n')))
 
-        if code_prompt_pattern.match(linea):
-            if not in_code_block:
-                lineas_procesadas.append("\n```python")
-                in_code_block = True
-            lineas_procesadas.append(linea)
-            continue
-        elif in_code_block:
-            lineas_procesadas.append("```\n")
-            in_code_block = False
 
-        if title_pattern.match(linea_limpia) and len(linea_limpia.split()) < 10:
-            lineas_procesadas.append(f"## {linea_limpia}\n")
-            continue
-        
-        if list_item_pattern.match(linea_limpia):
-            linea_lista = re.sub(r'^\s*[-*•]', '-', linea_limpia, 1)
-            lineas_procesadas.append(linea_lista)
-            continue
-            
-        lineas_procesadas.append(linea_limpia)
+def limpiar_y_estructurar_stream(fragmentos, patrones_ruido=None):
+    """
+    Versión en streaming de limpiar_y_estructurar_texto: recibe los fragmentos de
+    texto en bruto (p. ej. de extraer_texto_stream) y produce el Markdown poco a poco.
+    El estado de bloques de código y títulos se conserva entre fragmentos, por lo
+    que "".join(resultado) coincide con limpiar el texto completo unido con saltos de línea.
+    """
+    reglas = obtener_reglas(patrones_ruido)
+    return reglas.limpiar(_lineas_de_fragmentos(fragmentos))
+
+
+def _lineas_de_fragmentos(fragmentos):
+    for fragmento in fragmentos:
+        yield from fragmento.split('\n')
+
+# --- CABECERAS Y PIES DE PÁGINA REPETIDOS ---
+
+# Formatos paginados a los que se aplica por defecto. Las diapositivas de PPTX no: sus
+# títulos se repiten legítimamente y el texto de cada una es contenido, no maquetación
+FORMATOS_PAGINADOS = frozenset({'.pdf'})
+# Páginas iniciales que se leen para aprender qué líneas se repiten
+VENTANA_PAGINAS = 20
+# Con menos páginas no hay repetición que detectar con fiabilidad
+PAGINAS_MINIMAS = 4
+# Una línea debe repetirse en al menos esta proporción de páginas de la ventana...
+PROPORCION_REPETIDAS = 0.5
+# ...y nunca en menos de este número de páginas
+APARICIONES_MINIMAS = 3
+# Líneas no vacías de cada lado de la página que pueden quitarse, de fuera hacia dentro:
+# una interior solo se considera si la exterior de su lado también se quita
+LINEAS_BORDE = 2
+# Nunca se quita más de esta proporción de las líneas no vacías de una página (ni todas)
+PROPORCION_MAXIMA_QUITADA = 0.25
+# Numeración de página al principio o al final de la línea exterior: "3", "3 / 40", "3 de 40"
+_NUMERO_PAGINA = re.compile(r'^\d+\b|\b\d+(?:\s*(?:/|[^\W\d_]{1,3})\s*\d+)?$')
+_SOLO_NUMERO_PAGINA = re.compile(r'[^\w]*\d+(?:\s*/\s*\d+)?[^\w]*')
+_LETRA = re.compile(r'[^\W\d_]')
+
+def _clave_borde(linea, exterior):
+    """
+    Hash normalizado de una línea de borde, o None si no puede ser cabecera ni pie: solo
+    se comparan líneas con letras (las filas numéricas son contenido) y, en la exterior,
+    una numeración de página sola. Solo en la exterior la numeración es un comodín, de modo
+    que "Página 3" y "Página 4" coinciden pero "Sección 3" y "Sección 4" en el interior no.
+    """
+    texto = " ".join(linea.lower().split())
+    if exterior:
+        if not _LETRA.search(texto) and not _SOLO_NUMERO_PAGINA.fullmatch(texto):
+            return None
+        texto = _NUMERO_PAGINA.sub('#', texto)
+    elif not _LETRA.search(texto):
+        return None
+    return hash(texto)
+
+def _bordes(lineas):
+    """Índices de las líneas de borde de la cabecera y del pie, de fuera hacia dentro."""
+    no_vacias = [i for i, linea in enumerate(lineas) if linea.strip()]
+    return no_vacias, (no_vacias[:LINEAS_BORDE], no_vacias[::-1][:LINEAS_BORDE])
+
+def _lineas_a_quitar(lineas, repetidas):
+    no_vacias, lados = _bordes(lineas)
+    quitar = set()
+    for lado in lados:
+        for posicion, i in enumerate(lado):
+            if i in quitar or _clave_borde(lineas[i], posicion == 0) not in repetidas:
+                break
+            quitar.add(i)
+    # Límite de seguridad: una página que perdería demasiado se deja como está
+    if len(quitar) >= len(no_vacias) or len(quitar) > PROPORCION_MAXIMA_QUITADA * len(no_vacias):
+        return set()
+    return quitar
+
+def quitar_lineas_repetidas(paginas, ventana=VENTANA_PAGINAS, proporcion=PROPORCION_REPETIDAS):
+    """
+    Generador que recibe el texto por páginas (p. ej. de extraer_texto_stream) y quita
+    las cabeceras, pies y numeraciones que se repiten en muchas páginas, en cualquier idioma.
+    Las primeras `ventana` páginas sirven para aprender las líneas de borde repetidas (por
+    su hash normalizado); después cada página se filtra con una búsqueda en un conjunto, de
+    modo que el coste es lineal en el número total de líneas. Una página nunca se vacía ni
+    pierde más de PROPORCION_MAXIMA_QUITADA de sus líneas.
+    """
+    paginas = iter(paginas)
+    aprendidas = [pagina.split('\n') for pagina in itertools.islice(paginas, ventana)]
+    repetidas = set()
+    if len(aprendidas) >= PAGINAS_MINIMAS:
+        apariciones = {}
+        for lineas in aprendidas:
+            claves = {_clave_borde(lineas[i], posicion == 0)
+                      for lado in _bordes(lineas)[1] for posicion, i in enumerate(lado)}
+            for clave in claves - {None}:
+                apariciones[clave] = apariciones.get(clave, 0) + 1
+        minimo = max(APARICIONES_MINIMAS, proporcion * len(aprendidas))
+        repetidas = {clave for clave, veces in apariciones.items() if veces >= minimo}
+    if not repetidas:
+        for lineas in aprendidas: yield "\n".join(lineas)
+        yield from paginas
+        return
+    for lineas in itertools.chain(aprendidas, (pagina.split('\n') for pagina in paginas)):
+        quitar = _lineas_a_quitar(lineas, repetidas)
+        yield "\n".join(linea for i, linea in enumerate(lineas) if i not in quitar)
+
+def _sin_repetidas(unidades, extension, quitar_repetidas=None, **_):
+    """Aplica quitar_lineas_repetidas según la opción, o por defecto a los formatos paginados."""
+    if quitar_repetidas is None:
+        quitar_repetidas = extension.lower() in FORMATOS_PAGINADOS
+    return quitar_lineas_repetidas(unidades) if quitar_repetidas else unidades
+
+# --- PROCESOS HIJOS ---
+
+# Todos los procesos hijos (ejecución aislada, pool de PDF, carril de procesos del
+# planificador) se crean con 'spawn' y no con fork: así no heredan hilos ni locks del
+# proceso que llama (servidor web, GUI de Qt) que podrían quedar bloqueados en el hijo
+CONTEXTO_PROCESOS = multiprocessing.get_context('spawn')
+
+class PoolProcesos:
+    """
+    ProcessPoolExecutor de CONTEXTO_PROCESOS que se crea la primera vez que se usa. Si
+    un proceso muere (falta de memoria, fallo en una biblioteca en C...) el pool queda
+    inservible: usar() lo descarta al ver BrokenProcessPool y el siguiente uso crea otro.
+    """
+
+    def __init__(self, max_procesos, iniciar=None, args_iniciar=()):
+        self.max_procesos = max_procesos
+        self._iniciar = iniciar
+        self._args_iniciar = args_iniciar
+        self._pool = None
+        self._lock = threading.Lock()
 
-    if in_code_block:
-        lineas_procesadas.append("```\n")
-        
-    texto_completo = "\n".join(lineas_procesadas)
-    
-    texto_completo = re.sub(r'\n{3,}', '\n\n', texto_completo)
-    texto_completo = re.sub(r'(\n## .*?)\n+', r'\1\n\n', texto_completo)
-    texto_completo = re.sub(r'\n(```)', r'\n\n\1', texto_completo)
-    texto_completo = re.sub(r'(```)\n', r'\1\n\n', texto_completo)
+    @contextmanager
+    def usar(self):
+        """Bloque con el pool; si dentro se lanza BrokenProcessPool, el pool se descarta."""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_procesos, mp_context=CONTEXTO_PROCESOS,
+                                                 initializer=self._iniciar, initargs=self._args_iniciar)
+            pool = self._pool
+        try:
+            yield pool
+        except BrokenProcessPool:
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
 
-    return texto_completo.strip()
+    def cerrar(self, esperar=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=esperar, cancel_futures=not esperar)
 
 # --- CONSTANTE Y FUNCIÓN PRINCIPAL DE EXTRACCIÓN ---
 
-EXTRACTORES = {
-    '.pdf': '_extraer_pdf', '.docx': '_extraer_docx', '.txt': '_extraer_txt',
-    '.html': '_extraer_html', '.xml': '_extraer_xml', '.pptx': '_extraer_pptx',
-    '.xlsx': '_extraer_xlsx', '.odt': '_extraer_odt', '.rtf': '_extraer_rtf',
-    '.epub': '_extraer_epub', '.md': '_extraer_md', '.json': '_extraer_json',
-    '.csv': '_extraer_csv',
-}
+# Registro de extractores: extensión -> función generadora. Los formatos de terceros
+# se registran mediante entry points y se cargan solo cuando se usan por primera vez.
+EXTRACTORES = {}
+# Módulos de terceros que necesita cada formato (para precargar_extractores)
+_DEPENDENCIAS = {}
+GRUPO_PLUGINS = "dissentis_parser.extractores"
+
+def registrar_extractor(extension, *modulos):
+    """
+    Decorador que registra una función extractora para una extensión. La función
+    recibe (fuente, progress_callback, **opciones) y produce el texto por unidades.
+    Entre las opciones puede llegar cancelacion; los extractores con bucles largos
+    sin producir unidades pueden llamar a comprobar_cancelacion(cancelacion).
+    """
+    def decorador(funcion):
+        EXTRACTORES[extension.lower()] = funcion
+        _DEPENDENCIAS[extension.lower()] = modulos
+        return funcion
+    return decorador
+
+def obtener_extractor(extension):
+    """Devuelve el extractor de una extensión, cargando el plugin si es la primera vez."""
+    extension = extension.lower()
+    extractor = EXTRACTORES.get(extension)
+    if extractor is not None and not callable(extractor):
+        extractor = EXTRACTORES[extension] = extractor.load()
+    return extractor
+
+def precargar_extractores():
+    """
+    Importa por adelantado todas las dependencias y plugins. Pensado para el proceso
+    maestro de la API (p. ej. gunicorn --preload) antes de crear los workers.
+    """
+    for extension in list(EXTRACTORES):
+        for modulo in _DEPENDENCIAS.get(extension, ()):
+            importlib.import_module(modulo)
+        obtener_extractor(extension)
+
+def _registrar_plugins():
+    # Los entry points se anotan sin importarlos; obtener_extractor los carga al usarlos
+    try:
+        puntos = entry_points(group=GRUPO_PLUGINS)
+    except Exception:
+        return
+    for punto in puntos:
+        extension = punto.name if punto.name.startswith('.') else f".{punto.name}"
+        EXTRACTORES.setdefault(extension.lower(), punto)
+
+# Versión de los extractores: incrementarla al cambiar su salida invalida la caché
+VERSION_EXTRACCION = "1"
+
+# Opciones de extracción que no alteran el resultado y no forman parte de la clave de caché
+_OPCIONES_SIN_EFECTO = {'procesos', 'cancelacion', 'cache_partes', 'partes_recalculadas'}
+
+# Los PDF con al menos este número de páginas se reparten entre varios procesos
+PDF_PAGINAS_PARALELO = 40
+# Procesos del pool compartido por todas las extracciones de PDF en paralelo: varios
+# documentos a la vez (GUI, lotes de la API) no lanzan más procesos que núcleos
+PDF_PROCESOS_MAX = os.cpu_count() or 1
+_pool_pdf = PoolProcesos(PDF_PROCESOS_MAX)
+
+# Calidades de extracción de PDF: 'completa' agrupa los caracteres en palabras y líneas
+# con pdfplumber; 'rapida' toma el texto de pdfium (pypdfium2, dependencia de pdfplumber),
+# decenas de veces más rápido y útil para clasificar o indexar, aunque sin ese agrupamiento
+CALIDADES_PDF = ('completa', 'rapida')
+# pdfium no admite llamadas simultáneas desde varios hilos
+_LOCK_PDFIUM = threading.Lock()
 
-def extraer_texto(ruta_archivo: str, progress_callback=None) -> str:
+def _calidad_pdf(calidad_pdf):
+    if calidad_pdf is None:
+        return 'completa'
+    if calidad_pdf not in CALIDADES_PDF:
+        raise ValueError(f"Calidad de PDF '{calidad_pdf}' no válida (opciones: {', '.join(CALIDADES_PDF)}).")
+    return calidad_pdf
+
+def analizar_rango_paginas(paginas) -> list:
+    """
+    Convierte una selección de páginas numeradas desde 1 ("1-5,8,10-" o una secuencia de
+    enteros) en una lista de tramos (inicio, fin), con fin None si llega hasta el final.
+    Lanza ValueError si la selección no es válida.
     """
-    Toma la ruta de un archivo, detecta su tipo y extrae el texto en bruto.
+    if isinstance(paginas, int):
+        paginas = [paginas]
+    elementos = paginas.split(',') if isinstance(paginas, str) else list(paginas)
+    tramos = []
+    for elemento in elementos:
+        if isinstance(elemento, int):
+            inicio, fin = elemento, elemento
+        else:
+            inicio, separador, fin = str(elemento).strip().partition('-')
+            if not inicio.strip().isdigit() or (fin.strip() and not fin.strip().isdigit()):
+                raise ValueError(f"Rango de páginas no válido: '{elemento}' (ejemplo: 1-5,8,10-).")
+            inicio = int(inicio)
+            fin = int(fin) if fin.strip() else (None if separador else inicio)
+        if inicio < 1:
+            raise ValueError(f"Rango de páginas no válido: '{elemento}' (las páginas empiezan en 1).")
+        if fin is not None and fin < inicio:
+            raise ValueError(f"Rango de páginas no válido: '{elemento}' (el final es anterior al inicio).")
+        tramos.append((inicio, fin))
+    if not tramos:
+        raise ValueError("El rango de páginas está vacío.")
+    return tramos
+
+def seleccionar_paginas(total_paginas, paginas=None, max_paginas=None) -> list:
+    """
+    Índices (desde 0) y en orden de las páginas a extraer de un documento de total_paginas:
+    las de la selección paginas (ver analizar_rango_paginas; todas si es None), sin repetir,
+    y como mucho las max_paginas primeras. Las páginas fuera del documento se ignoran.
+    """
+    if paginas is None:
+        seleccion = range(total_paginas)
+    else:
+        indices = set()
+        for inicio, fin in analizar_rango_paginas(paginas):
+            indices.update(range(inicio - 1, min(fin or total_paginas, total_paginas)))
+        seleccion = sorted(indices)
+    if max_paginas is not None:
+        if max_paginas < 1:
+            raise ValueError("max_paginas debe ser un entero positivo.")
+        seleccion = seleccion[:max_paginas]
+    return list(seleccion)
+
+def extraer_texto(fuente, progress_callback=None, nombre_archivo=None, metricas=None, **opciones) -> str:
     """
-    ruta = Path(ruta_archivo)
+    Toma un archivo, detecta su tipo y extrae el texto en bruto.
+    La fuente puede ser una ruta, bytes o un objeto de archivo binario; en los dos
+    últimos casos el formato se deduce de nombre_archivo. Las opciones adicionales se
+    pasan al extractor del formato (p. ej. procesos=1 para forzar la extracción de PDF en serie,
+    o calidad_pdf='rapida', paginas='1-5,8' y max_paginas=10 para extraer solo parte de un PDF).
+    Si se indica un registro de métricas (metricas.RegistroMetricas) se mide la etapa de extracción.
+    """
+    nombre = _nombre_fuente(fuente, nombre_archivo)
     try:
-        if not ruta.is_file():
+        if isinstance(fuente, (str, os.PathLike)) and not Path(fuente).is_file():
             return "Error: La ruta no corresponde a un archivo."
-        nombre_funcion_extractor = EXTRACTORES.get(ruta.suffix.lower())
-        if nombre_funcion_extractor:
-            extractor_func = globals()[nombre_funcion_extractor]
-            return extractor_func(ruta, progress_callback)
-        else:
-            return f"Error: Formato de archivo '{ruta.suffix}' no soportado."
+        extension = Path(nombre).suffix
+        if extension.lower() not in EXTRACTORES:
+            return f"Error: Formato de archivo '{extension}' no soportado."
+        with _etapa(metricas, 'extraccion', fuente, extension):
+            return "\n".join(extraer_texto_stream(fuente, progress_callback, nombre_archivo, **opciones))
     except Exception as e:
-        return f"Error al procesar el archivo '{ruta.name}': {e}"
-
-# --- FUNCIONES AUXILIARES DE EXTRACCIÓN (sin cambios) ---
-def _extraer_pdf(ruta, cb):
-    with pdfplumber.open(ruta) as pdf:
-        total_paginas = len(pdf.pages); texto_paginas = []
-        for i, page in enumerate(pdf.pages):
-            texto_paginas.append(page.extract_text(x_tolerance=1, y_tolerance=1) or "")
-            if cb: cb(int(((i + 1) / total_paginas) * 100))
-        return "\n".join(texto_paginas)
-def _extraer_docx(ruta, cb):
-    doc = docx.Document(ruta); texto = "\n".join(para.text for para in doc.paragraphs)
-    if cb: cb(100); return texto
-def _extraer_txt(ruta, cb):
-    texto = ruta.read_text(encoding='utf-8', errors='ignore')
-    if cb: cb(100); return texto
-def _extraer_html(ruta, cb):
-    html_content = ruta.read_text(encoding='utf-8', errors='ignore')
-    soup = BeautifulSoup(html_content, 'lxml'); texto = soup.get_text(separator='\n', strip=True)
-    if cb: cb(100); return texto
-def _extraer_xml(ruta, cb):
-    xml_content = ruta.read_text(encoding='utf-8', errors='ignore')
-    soup = BeautifulSoup(xml_content, 'lxml-xml'); texto = soup.get_text(separator='\n', strip=True)
-    if cb: cb(100); return texto
-def _extraer_pptx(ruta, cb):
-    prs = pptx.Presentation(ruta); texto = []
+        return f"Error al procesar el archivo '{nombre}': {e}"
+
+def extraer_texto_stream(fuente, progress_callback=None, nombre_archivo=None, **opciones):
+    """
+    Generador que extrae el texto en bruto por unidades (página, diapositiva, fila,
+    capítulo...) a medida que se leen, sin construir el documento completo.
+    Unir las unidades con "\\n" da el mismo resultado que extraer_texto.
+    Lanza ValueError si la ruta no es un archivo o el formato no está soportado.
+
+    Con la opción cancelacion (un threading.Event o cualquier objeto con is_set()) la
+    extracción se detiene con ExtraccionCancelada en cuanto se activa: se comprueba
+    entre unidades y en cada aviso de progreso, y el extractor también la recibe.
+    """
+    extension = Path(_nombre_fuente(fuente, nombre_archivo)).suffix
+    fuente = _abrir_fuente(fuente)
+    extractor_func = obtener_extractor(extension)
+    if extractor_func is None:
+        raise ValueError(f"Formato de archivo '{extension}' no soportado.")
+    cancelacion = opciones.get('cancelacion')
+    if cancelacion is None:
+        yield from extractor_func(fuente, progress_callback, **opciones)
+        return
+
+    def cb(progreso):
+        comprobar_cancelacion(cancelacion)
+        if progress_callback: progress_callback(progreso)
+
+    comprobar_cancelacion(cancelacion)
+    for unidad in extractor_func(fuente, cb, **opciones):
+        comprobar_cancelacion(cancelacion)
+        yield unidad
+
+class ExtraccionCancelada(Exception):
+    """La extracción se detuvo porque se activó su token de cancelación."""
+
+class LimiteRecursosExcedido(Exception):
+    """La extracción aislada superó el tiempo máximo o el límite de memoria."""
+
+def comprobar_cancelacion(cancelacion):
+    """Lanza ExtraccionCancelada si el token de cancelación está activado."""
+    if cancelacion is not None and cancelacion.is_set():
+        raise ExtraccionCancelada("Procesamiento cancelado.")
+
+def huella_archivo(fuente) -> str:
+    """Calcula el hash SHA-256 del contenido de un archivo leyéndolo por bloques."""
+    h = hashlib.sha256()
+    fuente = _abrir_fuente(fuente)
+    with (fuente.open('rb') if isinstance(fuente, Path) else _sin_cerrar(fuente)) as f:
+        while bloque := f.read(1024 * 1024):
+            h.update(bloque)
+    return h.hexdigest()
+
+def clave_cache(fuente, patrones_ruido=None, nombre_archivo=None, **opciones) -> str:
+    """
+    Clave de caché de un documento: contenido del archivo, formato, versión de los
+    extractores, huella de las reglas de limpieza y opciones que afectan a la salida.
+    """
+    extension = Path(_nombre_fuente(fuente, nombre_archivo)).suffix.lower()
+    opciones_relevantes = sorted((k, repr(v)) for k, v in opciones.items() if k not in _OPCIONES_SIN_EFECTO)
+    partes = (huella_archivo(fuente), extension, VERSION_EXTRACCION,
+              obtener_reglas(patrones_ruido).huella, repr(opciones_relevantes))
+    return hashlib.sha256("\x00".join(partes).encode('utf-8')).hexdigest()
+
+def procesar_documento(fuente, progress_callback=None, cache=None, patrones_ruido=None,
+                       nombre_archivo=None, metricas=None, **opciones) -> str:
+    """
+    Extrae y limpia un documento en streaming. Si se indica una caché (p. ej.
+    cache.CacheResultados), un documento ya procesado se devuelve sin volver a abrirlo.
+    Si se indica un registro de métricas se miden las etapas de caché, extracción y limpieza.
+    En PDF se quitan antes las cabeceras y pies repetidos entre páginas
+    (quitar_lineas_repetidas); la opción quitar_repetidas=False lo desactiva.
+
+    En EPUB, DOCX, PPTX y XLSX la opción cache_partes (otra caché, p. ej. una segunda
+    cache.CacheResultados) guarda el texto de cada parte del contenedor; al procesar una
+    versión nueva del documento solo se extraen las partes modificadas, cuyos nombres se
+    añaden a la lista partes_recalculadas si se indica (ver _PartesDocumento).
+    """
+    extension = Path(_nombre_fuente(fuente, nombre_archivo)).suffix
+    clave, texto_limpio = _buscar_en_cache(cache, fuente, patrones_ruido, nombre_archivo, metricas,
+                                           extension, progress_callback, **opciones)
+    if texto_limpio is not None:
+        return texto_limpio
+    fragmentos = extraer_texto_stream(fuente, progress_callback, nombre_archivo, **opciones)
+    if metricas is None:
+        texto_limpio = "".join(limpiar_y_estructurar_stream(
+            _sin_repetidas(fragmentos, extension, **opciones), patrones_ruido))
+    else:
+        # Extracción y limpieza se intercalan: el tiempo de extracción es el pasado dentro
+        # del generador del extractor y el resto se atribuye a la limpieza. La duración
+        # total y el pico de memoria se registran en la etapa conjunta extraccion_limpieza.
+        tiempo_extraccion = [0.0]
+        tamano = _tamano_fuente(fuente)
+        inicio = time.perf_counter()
+        with metricas.etapa('extraccion_limpieza', extension, tamano):
+            texto_limpio = "".join(limpiar_y_estructurar_stream(
+                _sin_repetidas(_cronometrar(fragmentos, tiempo_extraccion), extension, **opciones), patrones_ruido))
+        total = time.perf_counter() - inicio
+        metricas.observar('extraccion', tiempo_extraccion[0], None, extension, tamano)
+        metricas.observar('limpieza', max(total - tiempo_extraccion[0], 0.0), None, extension, tamano)
+    if cache is not None:
+        cache.guardar(clave, texto_limpio)
+    return texto_limpio
+
+def procesar_documento_stream(fuente, progress_callback=None, cache=None, patrones_ruido=None,
+                              nombre_archivo=None, metricas=None, **opciones):
+    """
+    Versión en streaming de procesar_documento: produce el texto limpio por fragmentos
+    a medida que se extrae, y "".join(resultado) coincide con procesar_documento.
+    Con caché, un documento ya procesado se produce de una vez y uno nuevo se guarda
+    al terminar (para ello los fragmentos se conservan hasta el final). Con métricas
+    se registran las etapas cache y extraccion_limpieza (la duración total de la
+    generación, incluido el tiempo que el consumidor tarda en pedir cada fragmento).
+    """
+    extension = Path(_nombre_fuente(fuente, nombre_archivo)).suffix
+    clave, texto_limpio = _buscar_en_cache(cache, fuente, patrones_ruido, nombre_archivo, metricas,
+                                           extension, progress_callback, **opciones)
+    if texto_limpio is not None:
+        yield texto_limpio
+        return
+    # El tamaño se toma antes de extraer: el consumidor puede cerrar la fuente al terminar
+    tamano = _tamano_fuente(fuente) if metricas is not None else None
+    inicio = time.perf_counter()
+    fragmentos = extraer_texto_stream(fuente, progress_callback, nombre_archivo, **opciones)
+    generados = [] if cache is not None else None
+    for fragmento in limpiar_y_estructurar_stream(_sin_repetidas(fragmentos, extension, **opciones), patrones_ruido):
+        if generados is not None: generados.append(fragmento)
+        yield fragmento
+    if metricas is not None:
+        metricas.observar('extraccion_limpieza', time.perf_counter() - inicio, None, extension, tamano)
+    if cache is not None:
+        cache.guardar(clave, "".join(generados))
+
+def _buscar_en_cache(cache, fuente, patrones_ruido, nombre_archivo, metricas, extension, progress_callback,
+                     **opciones):
+    """
+    Busca el documento en la caché (etapa cache de las métricas) y devuelve (clave, texto):
+    la clave con la que guardar el resultado (None sin caché) y el texto guardado (None si
+    no está). Si el documento ya estaba, informa del progreso completo.
+    """
+    if cache is None:
+        return None, None
+    with _etapa(metricas, 'cache', fuente, extension):
+        clave = clave_cache(fuente, patrones_ruido, nombre_archivo, **opciones)
+        texto_limpio = cache.obtener(clave)
+    if texto_limpio is not None and progress_callback:
+        progress_callback(100)
+    return clave, texto_limpio
+
+def _cronometrar(generador, acumulado):
+    """Reproduce el generador sumando en acumulado[0] el tiempo pasado dentro de él."""
+    iterador = iter(generador)
+    while True:
+        inicio = time.perf_counter()
+        try:
+            elemento = next(iterador)
+        except StopIteration:
+            acumulado[0] += time.perf_counter() - inicio
+            return
+        acumulado[0] += time.perf_counter() - inicio
+        yield elemento
+
+def _etapa(metricas, nombre, fuente, extension):
+    """Bloque medido en el registro de métricas, o un bloque vacío si no hay registro."""
+    if metricas is None:
+        return nullcontext()
+    return metricas.etapa(nombre, extension, _tamano_fuente(fuente))
+
+# --- SALIDA EN TROZOS (preparación para LLM) ---
+
+# Tamaño máximo por defecto de cada trozo, en caracteres
+TAMANO_TROZO = 4000
+
+def trocear_documento(fuente, progress_callback=None, patrones_ruido=None, nombre_archivo=None,
+                      max_caracteres=TAMANO_TROZO, **opciones):
+    """
+    Generador que extrae, limpia y divide un documento en trozos de como máximo
+    max_caracteres en una sola pasada y en streaming, sin construir el texto completo.
+    Cada trozo es un diccionario con indice, texto, inicio y fin (posición en el texto
+    que devolvería procesar_documento, con texto == texto_limpio[inicio:fin]), seccion
+    (el último título ## anterior) y unidad_inicio/unidad_fin: las unidades de origen,
+    numeradas desde 1 (página en PDF, diapositiva en PPTX, capítulo en EPUB...); con una
+    selección de páginas de PDF, el número de la página en el documento.
+    No usa la caché de resultados, que no conserva las unidades.
+    """
+    extension = Path(_nombre_fuente(fuente, nombre_archivo)).suffix
+    unidad = [0]
+    numeros = None
+    if extension.lower() == '.pdf' and (opciones.get('paginas') is not None or opciones.get('max_paginas') is not None):
+        total = _paginas_pdf(fuente)
+        if total is not None:
+            numeros = [n + 1 for n in seleccionar_paginas(total, opciones.get('paginas'), opciones.get('max_paginas'))]
+
+    def lineas():
+        unidades = extraer_texto_stream(fuente, progress_callback, nombre_archivo, **opciones)
+        for i, fragmento in enumerate(_sin_repetidas(unidades, extension, **opciones)):
+            unidad[0] = numeros[i] if numeros and i < len(numeros) else i + 1
+            yield from fragmento.split('\n')
+
+    # Cada segmento limpio se atribuye a la unidad de la línea que lo produjo
+    segmentos = ((unidad[0], segmento) for segmento in obtener_reglas(patrones_ruido).limpiar(lineas()))
+    return _trocear(segmentos, max_caracteres)
+
+def trocear_texto(texto_limpio, max_caracteres=TAMANO_TROZO):
+    """
+    Divide un texto ya limpio (p. ej. el de procesar_documento o la caché) en trozos
+    como trocear_documento, pero sin unidades de origen (unidad_inicio/fin son None).
+    """
+    def segmentos():
+        saltos = 0
+        for linea in texto_limpio.split('\n'):
+            if linea:
+                yield None, "\n" * saltos + linea
+                saltos = 1
+            elif saltos:
+                saltos += 1
+    return _trocear(segmentos(), max_caracteres)
+
+def _trocear(segmentos, max_caracteres):
+    """
+    Agrupa los segmentos del limpiador ("\\n" * saltos + línea) en trozos. Un título ##
+    siempre empieza un trozo nuevo; un bloque de código se mueve entero al trozo
+    siguiente si no cabe, y solo se parte si por sí solo supera el máximo. Las líneas
+    más largas que el máximo se cortan por un espacio.
+    """
+    indice = 0
+    posicion = 0
+    seccion = None
+    en_codigo = False
+    inicio_codigo = None   # Posición en el buffer de la apertura del bloque de código actual
+    buffer = []            # (saltos, línea, inicio, unidad, sección)
+    longitud = 0
+
+    def trozo(entradas):
+        nonlocal indice
+        texto = entradas[0][1] + "".join("\n" * saltos + linea for saltos, linea, *_ in entradas[1:])
+        indice += 1
+        return {"indice": indice - 1, "texto": texto, "inicio": entradas[0][2], "fin": entradas[0][2] + len(texto),
+                "seccion": entradas[0][4], "unidad_inicio": entradas[0][3], "unidad_fin": entradas[-1][3]}
+
+    def medir(entradas):
+        return sum(len(linea) for _, linea, *_ in entradas) + sum(saltos for saltos, *_ in entradas[1:])
+
+    for unidad, segmento in segmentos:
+        linea = segmento.lstrip('\n')
+        saltos = len(segmento) - len(linea)
+        inicio = posicion + saltos
+        posicion = inicio + len(linea)
+        es_titulo = not en_codigo and linea.startswith('## ')
+
+        if buffer and (es_titulo or longitud + saltos + len(linea) > max_caracteres):
+            if not es_titulo and en_codigo and inicio_codigo:
+                # El bloque de código no cabe: se cierra el trozo justo antes de su apertura
+                yield trozo(buffer[:inicio_codigo])
+                buffer = buffer[inicio_codigo:]; longitud = medir(buffer); inicio_codigo = 0
+            if es_titulo or longitud + saltos + len(linea) > max_caracteres:
+                yield trozo(buffer)
+                buffer = []; longitud = 0; inicio_codigo = 0 if en_codigo else None
+        if es_titulo:
+            seccion = linea[3:]
+        while len(linea) > max_caracteres:
+            corte = linea.rfind(' ', 1, max_caracteres + 1)
+            corte = corte if corte > 0 else max_caracteres
+            yield trozo([(0, linea[:corte], inicio, unidad, seccion)])
+            salto = 1 if linea[corte:corte + 1] == ' ' else 0
+            linea = linea[corte + salto:]; inicio += corte + salto
+        if linea:
+            longitud += (saltos if buffer else 0) + len(linea)
+            buffer.append((saltos, linea, inicio, unidad, seccion))
+        if linea.startswith('```'):
+            en_codigo = not en_codigo
+            inicio_codigo = len(buffer) - 1 if en_codigo else None
+    if buffer:
+        yield trozo(buffer)
+
+# --- EJECUCIÓN AISLADA (proceso hijo con límites de tiempo y memoria) ---
+
+def procesar_documento_aislado(fuente, progress_callback=None, cache=None, patrones_ruido=None,
+                               nombre_archivo=None, metricas=None, timeout=None, memoria_max_mb=None,
+                               **opciones) -> str:
+    """
+    Igual que procesar_documento, pero la extracción y la limpieza se ejecutan en un
+    proceso hijo que se termina si supera timeout segundos de reloj o si intenta usar
+    más de memoria_max_mb megabytes (RLIMIT_AS, solo en Unix). En ambos casos se lanza
+    LimiteRecursosExcedido y el proceso que llama sigue intacto; con la opción
+    cancelacion activada, el hijo se termina de inmediato y se lanza ExtraccionCancelada.
+    La caché y las métricas (una única etapa extraccion_limpieza, medida desde fuera
+    del hijo) se gestionan en el proceso que llama. En el hijo los PDF se
+    procesan en serie (procesos=1), para que al terminarlo no queden procesos huérfanos.
+    La caché de partes (cache_partes) no se comparte con el hijo y se ignora.
+    """
+    cancelacion = opciones.pop('cancelacion', None)
+    opciones.pop('cache_partes', None); opciones.pop('partes_recalculadas', None)
+    nombre = _nombre_fuente(fuente, nombre_archivo)
+    extension = Path(nombre).suffix
+    clave, texto_limpio = _buscar_en_cache(cache, fuente, patrones_ruido, nombre_archivo, metricas,
+                                           extension, progress_callback, **opciones)
+    if texto_limpio is not None:
+        return texto_limpio
+    opciones['procesos'] = 1
+    memoria_max_bytes = int(memoria_max_mb * 1024 * 1024) if memoria_max_mb else None
+    fuente = _abrir_fuente(fuente)
+    with _etapa(metricas, 'extraccion_limpieza', fuente, extension), _como_ruta(fuente, extension) as ruta:
+        texto_limpio = _ejecutar_aislado(str(ruta), nombre, patrones_ruido, opciones, progress_callback,
+                                         timeout, memoria_max_bytes, cancelacion)
+    if cache is not None:
+        cache.guardar(clave, texto_limpio)
+    return texto_limpio
+
+def _ejecutar_aislado(ruta, nombre, patrones_ruido, opciones, progress_callback, timeout,
+                      memoria_max_bytes, cancelacion):
+    receptor, emisor = CONTEXTO_PROCESOS.Pipe(duplex=False)
+    proceso = CONTEXTO_PROCESOS.Process(target=_proceso_aislado, daemon=True,
+                                        args=(emisor, ruta, nombre, patrones_ruido, memoria_max_bytes, opciones))
+    proceso.start()
+    emisor.close()
+    limite = time.monotonic() + timeout if timeout else None
+    try:
+        while True:
+            if cancelacion is not None and cancelacion.is_set():
+                raise ExtraccionCancelada("Procesamiento cancelado.")
+            if limite is not None and time.monotonic() > limite:
+                raise LimiteRecursosExcedido(f"El documento superó el tiempo máximo de procesamiento ({timeout} s).")
+            if not receptor.poll(0.1):
+                continue
+            try:
+                tipo, valor = receptor.recv()
+            except EOFError:
+                proceso.join(1)
+                detalle = (f"; es posible que superase el límite de memoria de {memoria_max_bytes // (1024 * 1024)} MB"
+                           if memoria_max_bytes else "")
+                raise LimiteRecursosExcedido(
+                    f"El proceso de extracción terminó de forma inesperada (código {proceso.exitcode}){detalle}.") from None
+            if tipo == 'progreso':
+                if progress_callback: progress_callback(valor)
+            elif tipo == 'resultado':
+                return valor
+            elif tipo == 'memoria':
+                detalle = f" ({valor})" if valor else ""
+                raise LimiteRecursosExcedido(
+                    f"El documento superó el límite de memoria de {memoria_max_bytes // (1024 * 1024)} MB{detalle}.")
+            else:
+                raise RuntimeError(valor)
+    finally:
+        receptor.close()
+        if proceso.is_alive():
+            proceso.kill()
+        proceso.join()
+
+def _proceso_aislado(conexion, ruta, nombre, patrones_ruido, memoria_max_bytes, opciones):
+    # Se ejecuta en el proceso hijo: aplica el límite de memoria y envía progreso y resultado
+    if memoria_max_bytes:
+        try:
+            import resource
+            resource.setrlimit(resource.RLIMIT_AS, (memoria_max_bytes, memoria_max_bytes))
+        except (ImportError, ValueError, OSError):
+            pass  # Sin límite de memoria en esta plataforma
+    try:
+        texto = procesar_documento(ruta, lambda p: conexion.send(('progreso', p)), patrones_ruido=patrones_ruido,
+                                   nombre_archivo=nombre, **opciones)
+        conexion.send(('resultado', texto))
+    except MemoryError:
+        conexion.send(('memoria', None))
+    except (OSError, ImportError) as e:
+        # Con RLIMIT_AS, cargar una extensión en C o reservar un buffer falla con estos
+        # errores ("failed to map segment", "Cannot allocate memory") en vez de MemoryError
+        conexion.send(('memoria' if memoria_max_bytes else 'error', str(e)))
+    except Exception as e:
+        conexion.send(('error', str(e)))
+    finally:
+        conexion.close()
+
+# --- PLANIFICACIÓN POR COSTE (estimación y ejecución en un pool de procesos) ---
+
+# Coste aproximado de extraer y limpiar cada formato, en segundos por MB de archivo y
+# en un solo núcleo (orden de magnitud medido con benchmarks/medir.py). Los PDF se
+# estiman por página siempre que el número de páginas se pueda leer sin analizarlos
+SEGUNDOS_POR_MB = {'.txt': 0.25, '.csv': 0.3, '.json': 0.4, '.html': 0.4, '.xml': 0.4, '.md': 2.6,
+                   '.odt': 1.5, '.rtf': 1.2, '.docx': 1.0, '.pptx': 0.6, '.epub': 1.0, '.xlsx': 4.0, '.pdf': 3.0}
+SEGUNDOS_POR_PAGINA_PDF = {'completa': 0.15, 'rapida': 0.002}
+# Formatos cuya extracción se hace en Python puro (pdfminer, openpyxl, análisis de los
+# capítulos) y retiene el GIL: los documentos grandes convienen en otro proceso
+FORMATOS_CPU = frozenset({'.pdf', '.epub', '.xlsx'})
+
+def estimar_coste(fuente, nombre_archivo=None, calidad_pdf=None, paginas=None, max_paginas=None, **_) -> dict:
+    """
+    Estima sin extraerlo el coste de procesar un documento a partir de su extensión, su
+    tamaño y, en los PDF, el número de páginas que se extraerán y la calidad. Devuelve un
+    diccionario con extension, tamano_bytes, paginas (None si no se conoce), segundos
+    (None si no hay tamaño) y cpu. Las opciones se validan al extraer, no aquí.
+    """
+    extension = Path(_nombre_fuente(fuente, nombre_archivo)).suffix.lower()
+    tamano = _tamano_fuente(fuente)
+    total = _paginas_pdf(fuente) if extension == '.pdf' else None
+    try:
+        segundos_pagina = SEGUNDOS_POR_PAGINA_PDF[_calidad_pdf(calidad_pdf)]
+        num_paginas = None if total is None else len(seleccionar_paginas(total, paginas, max_paginas))
+    except ValueError:
+        segundos_pagina, num_paginas = SEGUNDOS_POR_PAGINA_PDF['completa'], total
+    if num_paginas is not None:
+        segundos = num_paginas * segundos_pagina
+    elif tamano is not None:
+        segundos = tamano / (1024 * 1024) * SEGUNDOS_POR_MB.get(extension, 1.0)
+    else:
+        segundos = None
+    return {"extension": extension, "tamano_bytes": tamano, "paginas": num_paginas,
+            "segundos": segundos, "cpu": extension in FORMATOS_CPU}
+
+def _paginas_pdf(fuente):
+    """Número de páginas del PDF leído con pypdfium2 (dependencia de pdfplumber), o None."""
+    try:
+        import pypdfium2
+    except ImportError:
+        return None
+    if isinstance(fuente, (bytearray, memoryview)):
+        fuente = bytes(fuente)
+    elif isinstance(fuente, os.PathLike):
+        fuente = str(fuente)
+    posicion = fuente.tell() if hasattr(fuente, 'seek') and fuente.seekable() else None
+    try:
+        with _LOCK_PDFIUM:
+            documento = pypdfium2.PdfDocument(fuente)
+            try:
+                return len(documento)
+            finally:
+                documento.close()
+    except Exception:
+        return None  # PDF dañado o cifrado: se estimará por tamaño y fallará al extraerlo
+    finally:
+        if posicion is not None:
+            fuente.seek(posicion)
+
+# Caché de partes de cada proceso del pool (la crea iniciar_proceso_pool)
+_cache_partes_pool = None
+
+def iniciar_proceso_pool(fabrica_cache_partes=None, parametros_cache_partes=None):
+    """
+    Inicializador de los procesos del pool de procesar_documento_en_pool: cada proceso
+    crea su propia caché de partes con fabrica_cache_partes(**parametros_cache_partes),
+    p. ej. una CacheResultados sobre el mismo directorio que la del proceso principal.
+    """
+    global _cache_partes_pool
+    if fabrica_cache_partes is not None:
+        _cache_partes_pool = fabrica_cache_partes(**(parametros_cache_partes or {}))
+
+def procesar_documento_en_pool(fuente, ejecutar, progress_callback=None, cache=None, patrones_ruido=None,
+                               nombre_archivo=None, metricas=None, **opciones) -> str:
+    """
+    Igual que procesar_documento, pero la extracción y la limpieza se envían a otro
+    proceso llamando a ejecutar(funcion, *argumentos), que debe devolver el resultado
+    de funcion(*argumentos) ejecutada allí (p. ej. el carril de procesos de un
+    Planificador). Como en procesar_documento_aislado, la caché y las métricas se
+    gestionan en el proceso que llama, los PDF se procesan en serie (procesos=1) y el
+    progreso solo se informa al terminar. La caché de partes es la de cada proceso del
+    pool (iniciar_proceso_pool); las partes que extrae se añaden a partes_recalculadas.
+    """
+    cancelacion = opciones.pop('cancelacion', None)
+    opciones.pop('cache_partes', None)
+    partes_recalculadas = opciones.pop('partes_recalculadas', None)
+    nombre = _nombre_fuente(fuente, nombre_archivo)
+    extension = Path(nombre).suffix
+    clave, texto_limpio = _buscar_en_cache(cache, fuente, patrones_ruido, nombre_archivo, metricas,
+                                           extension, progress_callback, **opciones)
+    if texto_limpio is not None:
+        return texto_limpio
+    comprobar_cancelacion(cancelacion)
+    opciones['procesos'] = 1
+    fuente = _abrir_fuente(fuente)
+    tamano = _tamano_fuente(fuente)
+    with _como_ruta(fuente, extension) as ruta:
+        texto_limpio, partes, segundos = ejecutar(_procesar_en_pool, str(ruta), nombre, patrones_ruido, opciones)
+    # Se registra el tiempo de procesamiento en el hijo, sin la espera en la cola del pool
+    if metricas is not None:
+        metricas.observar('extraccion_limpieza', segundos, None, extension, tamano)
+    if partes_recalculadas is not None:
+        partes_recalculadas.extend(partes)
+    if progress_callback: progress_callback(100)
+    if cache is not None:
+        cache.guardar(clave, texto_limpio)
+    return texto_limpio
+
+def _procesar_en_pool(ruta, nombre, patrones_ruido, opciones):
+    # Se ejecuta en un proceso del pool: devuelve (texto, partes extraídas, segundos)
+    inicio = time.perf_counter()
+    partes = []
+    texto = procesar_documento(ruta, patrones_ruido=patrones_ruido, nombre_archivo=nombre,
+                               cache_partes=_cache_partes_pool, partes_recalculadas=partes, **opciones)
+    return texto, partes, time.perf_counter() - inicio
+
+# --- MANEJO DE FUENTES (rutas, bytes u objetos de archivo) ---
+
+def _nombre_fuente(fuente, nombre_archivo=None) -> str:
+    """Nombre con el que se identifica la fuente; de él se deduce la extensión."""
+    if nombre_archivo:
+        return Path(nombre_archivo).name
+    if isinstance(fuente, (str, os.PathLike)):
+        return Path(fuente).name
+    nombre = getattr(fuente, 'name', None)
+    return Path(nombre).name if isinstance(nombre, str) else ""
+
+def _tamano_fuente(fuente):
+    """Tamaño en bytes de la fuente, o None si no puede determinarse sin leerla."""
+    if isinstance(fuente, (str, os.PathLike)):
+        try:
+            return os.path.getsize(fuente)
+        except OSError:
+            return None
+    if isinstance(fuente, (bytes, bytearray, memoryview)):
+        return len(fuente)
+    if fuente.seekable():
+        posicion = fuente.tell()
+        tamano = fuente.seek(0, io.SEEK_END)
+        fuente.seek(posicion)
+        return tamano
+    return None
+
+def _abrir_fuente(fuente):
+    """
+    Normaliza la fuente para los extractores: las rutas se validan y se devuelven como
+    Path, los bytes se envuelven en BytesIO y los objetos de archivo se rebobinan.
+    """
+    if isinstance(fuente, (str, os.PathLike)):
+        ruta = Path(fuente)
+        if not ruta.is_file():
+            raise ValueError("La ruta no corresponde a un archivo.")
+        return ruta
+    if isinstance(fuente, (bytes, bytearray, memoryview)):
+        return io.BytesIO(fuente)
+    if fuente.seekable():
+        fuente.seek(0)
+    return fuente
+
+@contextmanager
+def _sin_cerrar(archivo):
+    # Los objetos de archivo recibidos pertenecen al llamador: se rebobinan pero no se cierran
+    try:
+        yield archivo
+    finally:
+        if archivo.seekable():
+            archivo.seek(0)
+
+@contextmanager
+def _abrir_texto(fuente, encoding='utf-8'):
+    """Abre la fuente en modo texto ignorando los errores de codificación."""
+    if isinstance(fuente, Path):
+        with fuente.open('r', encoding=encoding, errors='ignore') as f:
+            yield f
+    else:
+        f = io.TextIOWrapper(fuente, encoding=encoding, errors='ignore')
+        try:
+            yield f
+        finally:
+            f.detach()
+
+@contextmanager
+def _como_ruta(fuente, sufijo):
+    """
+    Garantiza una ruta en disco para las bibliotecas o procesos que la necesitan. Los
+    objetos de archivo se vuelcan a un temporal con nombre único que se borra al salir.
+    """
+    if isinstance(fuente, Path):
+        yield fuente
+        return
+    descriptor, nombre_temporal = tempfile.mkstemp(suffix=sufijo)
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            fuente.seek(0)
+            shutil.copyfileobj(fuente, f)
+        yield Path(nombre_temporal)
+    finally:
+        os.remove(nombre_temporal)
+
+# --- RE-EXTRACCIÓN INCREMENTAL DE CONTENEDORES ZIP ---
+
+# Formatos cuyo extractor reutiliza el texto de las partes sin cambios
+FORMATOS_POR_PARTES = frozenset({'.epub', '.docx', '.pptx', '.xlsx'})
+# Tamaño máximo (en caracteres) de una hoja de XLSX que se guarda en la caché de partes:
+# las mayores se leen fila a fila sin acumularlas en memoria
+CARACTERES_PARTE_MAX = 4 * 1024 * 1024
+
+class _PartesDocumento:
+    """
+    Texto extraído de cada parte de un contenedor zip (capítulo, diapositiva, hoja...)
+    guardado en la opción cache_partes con una clave derivada de la huella de la parte,
+    de modo que una parte sin cambios no se vuelve a analizar aunque el resto del
+    documento sí haya cambiado. Las partes extraídas de nuevo se anotan en la lista
+    partes_recalculadas. Se guarda el texto extraído y no el limpio porque la limpieza
+    depende de las partes vecinas (bloques de código, cabeceras repetidas); repetirla
+    es lineal y garantiza el mismo resultado que procesar el documento entero.
+    Cada extractor indica en relevantes solo las opciones que cambian el texto de sus
+    partes (p. ej. el motor de marcado en EPUB), que forman parte de la clave.
+    """
+
+    def __init__(self, extension, cache_partes=None, partes_recalculadas=None, **relevantes):
+        self.cache = cache_partes
+        self.recalculadas = partes_recalculadas
+        relevantes = sorted((k, repr(v)) for k, v in relevantes.items())
+        self._prefijo = "\x00".join(("parte", extension, VERSION_EXTRACCION, repr(relevantes)))
+
+    @property
+    def activa(self):
+        return self.cache is not None or self.recalculadas is not None
+
+    def buscar(self, huella):
+        """
+        Devuelve (clave, texto guardado). La clave es None si no hay caché o la huella es
+        None (parte no localizada en el zip); el texto, None si la parte no está guardada.
+        """
+        if self.cache is None or huella is None:
+            return None, None
+        clave = hashlib.sha256(f"{self._prefijo}\x00{huella}".encode('utf-8')).hexdigest()
+        return clave, self.cache.obtener(clave)
+
+    def guardar(self, parte, clave, texto):
+        """Anota la parte como recalculada y guarda su texto (si hay clave y texto)."""
+        if self.recalculadas is not None:
+            self.recalculadas.append(parte)
+        if clave is not None and texto is not None:
+            self.cache.guardar(clave, texto)
+
+    def extraer(self, parte, huella, funcion):
+        """
+        Devuelve el texto guardado para la huella o, si no está, el de funcion(), que
+        se guarda. Si funcion() devuelve None (parte sin texto) no se guarda nada.
+        """
+        clave, texto = self.buscar(huella)
+        if texto is not None:
+            return texto
+        texto = funcion()
+        self.guardar(parte, clave, texto)
+        return texto
+
+def _huellas_zip(fuente):
+    """Huella (CRC-32 y tamaño) de cada miembro del zip, leída del índice central sin descomprimir."""
+    with zipfile.ZipFile(fuente) as z:
+        return {info.filename: f"{info.CRC:08x}:{info.file_size}" for info in z.infolist()}
+
+# --- FUNCIONES AUXILIARES DE EXTRACCIÓN ---
+# Cada extractor es un generador que produce el texto de una unidad cada vez.
+@registrar_extractor('.pdf', 'pdfplumber', 'pypdfium2')
+def _extraer_pdf(fuente, cb, procesos=None, calidad_pdf=None, paginas=None, max_paginas=None, **_):
+    calidad_pdf = _calidad_pdf(calidad_pdf)
+    if calidad_pdf == 'rapida':
+        yield from _extraer_pdf_rapido(fuente, cb, paginas, max_paginas)
+        return
+    import pdfplumber
+    if procesos is None: procesos = PDF_PROCESOS_MAX
+    seleccion = None
+    if paginas is not None or max_paginas is not None:
+        # Con el número de páginas de pdfium, pdfplumber solo prepara las seleccionadas
+        total = _paginas_pdf(fuente)
+        if total is None:
+            with pdfplumber.open(fuente) as pdf:
+                total = len(pdf.pages)
+        seleccion = seleccionar_paginas(total, paginas, max_paginas)
+    with pdfplumber.open(fuente, pages=None if seleccion is None else [n + 1 for n in seleccion]) as pdf:
+        if seleccion is None: seleccion = list(range(len(pdf.pages)))
+        total_paginas = len(seleccion)
+        if procesos <= 1 or total_paginas < PDF_PAGINAS_PARALELO:
+            for i, page in enumerate(pdf.pages):
+                yield page.extract_text(x_tolerance=1, y_tolerance=1) or ""
+                page.close()  # Libera la caché de objetos de la página ya procesada
+                if cb: cb(int(((i + 1) / total_paginas) * 100))
+            return
+    with _como_ruta(fuente, '.pdf') as ruta:
+        yield from _extraer_pdf_paralelo(ruta, cb, seleccion, procesos)
+def _extraer_pdf_paralelo(ruta, cb, seleccion, procesos):
+    """
+    Reparte las páginas seleccionadas en lotes entre el pool de procesos compartido. Cada
+    proceso abre el PDF por su cuenta; los lotes se devuelven en orden de página aunque
+    terminen desordenados. Al terminar o interrumpirse se cancelan los lotes pendientes.
+    """
+    total_paginas = len(seleccion)
+    tam_lote = max(1, -(-total_paginas // (min(procesos, PDF_PROCESOS_MAX) * 4)))
+    lotes = [seleccion[i:i + tam_lote] for i in range(0, total_paginas, tam_lote)]
+    futuros = {}
+    try:
+        with _pool_pdf.usar() as pool:
+            futuros = {pool.submit(_extraer_paginas_pdf, str(ruta), lote): indice for indice, lote in enumerate(lotes)}
+            terminados = {}; siguiente = 0; paginas_hechas = 0
+            for futuro in as_completed(futuros):
+                terminados[futuros[futuro]] = textos = futuro.result()
+                paginas_hechas += len(textos)
+                if cb: cb(int((paginas_hechas / total_paginas) * 100))
+                while siguiente in terminados:
+                    yield from terminados.pop(siguiente)
+                    siguiente += 1
+    finally:
+        for futuro in futuros:
+            futuro.cancel()
+def _extraer_paginas_pdf(ruta, indices):
+    # Se ejecuta en un proceso hijo (las páginas de pdfplumber son 1-indexadas)
+    import pdfplumber
+    with pdfplumber.open(ruta, pages=[n + 1 for n in indices]) as pdf:
+        textos = []
+        for page in pdf.pages:
+            textos.append(page.extract_text(x_tolerance=1, y_tolerance=1) or "")
+            page.close()
+        return textos
+def _extraer_pdf_rapido(fuente, cb, paginas=None, max_paginas=None):
+    """
+    Calidad 'rapida': texto de cada página tal como lo ordena pdfium, sin agrupar los
+    caracteres en palabras y líneas por su posición como hace pdfplumber.
+    """
+    import pypdfium2
+    with _LOCK_PDFIUM:
+        documento = pypdfium2.PdfDocument(str(fuente) if isinstance(fuente, Path) else fuente)
+    try:
+        seleccion = seleccionar_paginas(len(documento), paginas, max_paginas)
+        for i, indice in enumerate(seleccion):
+            with _LOCK_PDFIUM:
+                pagina = documento[indice]
+                pagina_texto = pagina.get_textpage()
+                texto = pagina_texto.get_text_range()
+                pagina_texto.close(); pagina.close()
+            yield texto.replace('\r\n', '\n').replace('\r', '\n')
+            if cb: cb(int(((i + 1) / len(seleccion)) * 100))
+    finally:
+        with _LOCK_PDFIUM:
+            documento.close()
+@registrar_extractor('.docx', 'docx')
+def _extraer_docx(fuente, cb, cache_partes=None, partes_recalculadas=None, **_):
+    import docx
+    partes = _PartesDocumento('.docx', cache_partes, partes_recalculadas)
+    if not partes.activa:
+        doc = docx.Document(fuente)
+        for para in doc.paragraphs: yield para.text
+    else:
+        # Todo el texto está en una sola parte: sin cambios, ni siquiera se abre el documento
+        yield partes.extraer('word/document.xml', _huellas_zip(fuente).get('word/document.xml'),
+                             lambda: "\n".join(para.text for para in docx.Document(fuente).paragraphs))
+    if cb: cb(100)
+@registrar_extractor('.txt')
+def _extraer_txt(fuente, cb, **_):
+    # Por bloques cortados en saltos de línea: unidos con "\n" reproducen el archivo completo
+    with _abrir_texto(fuente) as f: yield from _lineas_por_bloques(_leer_por_bloques(f, TAMANO_BLOQUE_TEXTO))
+    if cb: cb(100)
+@registrar_extractor('.html', 'bs4', 'lxml')
+def _extraer_html(fuente, cb, motor=None, **_):
+    with _abrir_texto(fuente) as f:
+        if _motor_marcado('.html', motor) == 'lxml':
+            yield from _unidades_marcado(_leer_por_bloques(f), html=True)
+        else:
+            from bs4 import BeautifulSoup
+            soup = BeautifulSoup(f.read(), 'lxml'); yield soup.get_text(separator='\n', strip=True)
+    if cb: cb(100)
+@registrar_extractor('.xml', 'bs4', 'lxml')
+def _extraer_xml(fuente, cb, motor=None, **_):
+    with _abrir_texto(fuente) as f:
+        if _motor_marcado('.xml', motor) == 'lxml':
+            yield from _unidades_marcado(_leer_por_bloques(f), html=False)
+        else:
+            from bs4 import BeautifulSoup
+            soup = BeautifulSoup(f.read(), 'lxml-xml'); yield soup.get_text(separator='\n', strip=True)
+    if cb: cb(100)
+@registrar_extractor('.pptx', 'pptx')
+def _extraer_pptx(fuente, cb, cache_partes=None, partes_recalculadas=None, **_):
+    import pptx
+    partes = _PartesDocumento('.pptx', cache_partes, partes_recalculadas)
+    huellas = _huellas_zip(fuente) if partes.activa else {}
+    prs = pptx.Presentation(fuente)
+
+    def texto_diapositiva(slide):
+        texto = [shape.text for shape in slide.shapes if hasattr(shape, "text")]
+        return "\n".join(texto) if texto else None
+
     for slide in prs.slides:
-        for shape in slide.shapes:
-            if hasattr(shape, "text"): texto.append(shape.text)
-    if cb: cb(100); return "\n".join(texto)
-def _extraer_xlsx(ruta, cb):
-    workbook = openpyxl.load_workbook(ruta, read_only=True); texto = []
-    for sheetname in workbook.sheetnames:
-        sheet = workbook[sheetname]
-        for row in sheet.iter_rows():
-            row_text = [str(cell.value) for cell in row if cell.value is not None]
-            texto.append(" ".join(row_text))
-    if cb: cb(100); return "\n".join(texto)
-def _extraer_odt(ruta, cb):
-    doc = load_odt(ruta); all_paras = doc.getElementsByType(text.P)
-    texto = "\n".join(teletype.extractText(para) for para in all_paras)
-    if cb: cb(100); return texto
-def _extraer_rtf(ruta, cb):
-    rtf_content = ruta.read_text(encoding='ascii', errors='ignore')
-    texto = rtf_to_text(rtf_content);
-    if cb: cb(100); return texto
-def _extraer_epub(ruta, cb):
-    warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
-    book = epub.read_epub(ruta); texto = []
+        nombre = slide.part.partname.lstrip('/')
+        texto = partes.extraer(nombre, huellas.get(nombre), lambda: texto_diapositiva(slide))
+        if texto is not None: yield texto
+    if cb: cb(100)
+@registrar_extractor('.xlsx', 'openpyxl')
+def _extraer_xlsx(fuente, cb, max_filas=None, muestreo_filas=None, cache_partes=None, partes_recalculadas=None, **_):
+    # Solo valores (sin objetos de celda) y fila a fila: la memoria no depende del tamaño de la hoja.
+    # max_filas y muestreo_filas se aplican a cada hoja por separado.
+    # Con caché de partes una hoja sin cambios se reutiliza entera; su huella incluye las partes
+    # de las que dependen sus valores (textos compartidos, estilos de fecha y libro). Las demás
+    # se siguen leyendo fila a fila y solo se guardan si no superan CARACTERES_PARTE_MAX.
+    import openpyxl
+    partes = _PartesDocumento('.xlsx', cache_partes, partes_recalculadas, max_filas=max_filas,
+                              muestreo_filas=muestreo_filas)
+    huellas = _huellas_zip(fuente) if partes.activa else {}
+    comunes = ":".join(huellas.get(n, "-") for n in ('xl/sharedStrings.xml', 'xl/styles.xml', 'xl/workbook.xml'))
+    workbook = openpyxl.load_workbook(fuente, read_only=True)
+    try:
+        total_hojas = len(workbook.sheetnames)
+        for i, sheetname in enumerate(workbook.sheetnames):
+            hoja = workbook[sheetname]
+            nombre = clave = None
+            if partes.activa:
+                nombre = (getattr(hoja, '_worksheet_path', None) or "").lstrip('/') or sheetname
+                clave, texto = partes.buscar(f"{huellas[nombre]}:{comunes}" if nombre in huellas else None)
+                if texto is not None:
+                    yield texto
+                    if cb: cb(int((i + 1) / total_hojas * 100))
+                    continue
+            filas, caracteres = ([] if clave is not None else None), 0
+            for row in _filas_acotadas(hoja.iter_rows(values_only=True), max_filas, muestreo_filas):
+                fila = " ".join(str(valor) for valor in row if valor is not None)
+                if filas is not None:
+                    caracteres += len(fila) + 1
+                    if caracteres > CARACTERES_PARTE_MAX:
+                        filas = None  # Hoja demasiado grande para guardarla
+                    else:
+                        filas.append(fila)
+                yield fila
+            if partes.activa:
+                partes.guardar(nombre, clave, "\n".join(filas) if filas else None)
+            if cb: cb(int((i + 1) / total_hojas * 100))
+    finally:
+        workbook.close()
+    if cb: cb(100)
+@registrar_extractor('.odt', 'odf.opendocument')
+def _extraer_odt(fuente, cb, **_):
+    from odf import text, teletype
+    from odf.opendocument import load as load_odt
+    doc = load_odt(fuente)
+    for para in doc.getElementsByType(text.P): yield teletype.extractText(para)
+    if cb: cb(100)
+@registrar_extractor('.rtf', 'striprtf.striprtf')
+def _extraer_rtf(fuente, cb, **_):
+    from striprtf.striprtf import rtf_to_text
+    with _abrir_texto(fuente, 'ascii') as f: rtf_content = f.read()
+    yield rtf_to_text(rtf_content)
+    if cb: cb(100)
+@registrar_extractor('.epub', 'ebooklib.epub', 'bs4', 'lxml')
+def _extraer_epub(fuente, cb, motor=None, cache_partes=None, partes_recalculadas=None, **_):
+    from ebooklib import epub, ITEM_DOCUMENT
+    usar_lxml = _motor_marcado('.epub', motor) == 'lxml'
+    if not usar_lxml:
+        from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
+        warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
+    partes = _PartesDocumento('.epub', cache_partes, partes_recalculadas, motor='lxml' if usar_lxml else 'bs4')
+
+    def texto_capitulo(contenido):
+        if usar_lxml:
+            try:
+                contenido = contenido.decode('utf-8-sig')
+            except UnicodeDecodeError:
+                contenido = contenido.decode('cp1252', errors='replace')
+            return "\n".join(_textos_marcado([contenido], html=True))
+        soup = BeautifulSoup(contenido, 'lxml')
+        return soup.get_text(separator='\n', strip=True)
+
+    book = epub.read_epub(fuente)
     items = list(book.get_items_of_type(ITEM_DOCUMENT)); total_items = len(items)
     for i, item in enumerate(items):
-        soup = BeautifulSoup(item.get_content(), 'lxml')
-        texto.append(soup.get_text(separator='\n', strip=True))
+        contenido = item.get_content()
+        # El contenido ya está descomprimido en memoria: su CRC es la huella del capítulo
+        huella = f"{zlib.crc32(contenido):08x}:{len(contenido)}" if partes.activa else None
+        yield partes.extraer(item.get_name(), huella, lambda: texto_capitulo(contenido))
         if cb: cb(int(((i + 1) / total_items) * 100))
-    return "\n".join(texto)
-def _extraer_md(ruta, cb):
-    md_content = ruta.read_text(encoding='utf-8', errors='ignore')
-    html = markdown(md_content); soup = BeautifulSoup(html, 'lxml')
-    texto = soup.get_text(separator='\n', strip=True)
-    if cb: cb(100); return texto
-def _extraer_json(ruta, cb):
-    json_data = json.loads(ruta.read_text(encoding='utf-8', errors='ignore'))
-    texto = json.dumps(json_data, indent=2, ensure_ascii=False)
-    if cb: cb(100); return texto
-def _extraer_csv(ruta, cb):
-    with ruta.open(mode='r', encoding='utf-8', errors='ignore') as f:
-        reader = csv.reader(f); texto = "\n".join(["\t".join(row) for row in reader])
-    if cb: cb(100); return texto
+@registrar_extractor('.md', 'markdown', 'bs4', 'lxml')
+def _extraer_md(fuente, cb, motor=None, **_):
+    # Los archivos grandes se convierten por secciones (ver _secciones_markdown)
+    from markdown import markdown
+    grande = (_tamano_fuente(fuente) or 0) > TAMANO_BLOQUE_TEXTO
+    with _abrir_texto(fuente) as f:
+        referencias = _referencias_markdown(f) if grande else ""
+        htmls = (markdown(referencias + seccion) for seccion in _secciones_markdown(f))
+        if _motor_marcado('.md', motor) == 'lxml':
+            yield from _unidades_marcado(htmls, html=True)
+        else:
+            from bs4 import BeautifulSoup
+            soup = BeautifulSoup("\n".join(htmls), 'lxml')
+            yield soup.get_text(separator='\n', strip=True)
+    if cb: cb(100)
+@registrar_extractor('.json')
+def _extraer_json(fuente, cb, **_):
+    pequeno = (_tamano_fuente(fuente) or 0) <= UMBRAL_JSON_STREAMING
+    with _abrir_texto(fuente) as f:
+        if pequeno:
+            yield json.dumps(json.loads(f.read()), indent=2, ensure_ascii=False)
+        else:
+            # Sin construir el árbol de objetos: se reformatea token a token
+            yield from _unidades_json(_json_con_sangria(_leer_por_bloques(f, TAMANO_BLOQUE_TEXTO)))
+    if cb: cb(100)
+@registrar_extractor('.csv')
+def _extraer_csv(fuente, cb, max_filas=None, muestreo_filas=None, **_):
+    with _abrir_texto(fuente) as f:
+        for row in _filas_acotadas(csv.reader(f), max_filas, muestreo_filas): yield "\t".join(row)
+    if cb: cb(100)
+
+# --- EXTRACCIÓN DE TEXTO DE MARCADO (HTML, XML, Markdown, EPUB) ---
+
+# Motor por formato: 'lxml' recorre el documento de forma incremental sin construir el
+# árbol completo; 'bs4' usa BeautifulSoup.get_text. Ambos producen el mismo texto salvo
+# en XML con entidades declaradas en un DTD interno: lxml las sustituye por su valor y
+# BeautifulSoup (lxml-xml) pierde el documento entero. Por eso el motor forma parte de
+# la clave de caché. Se puede elegir en cada llamada con la opción motor='bs4' o motor='lxml'.
+MOTORES_MARCADO = ('lxml', 'bs4')
+MOTOR_MARCADO_POR_DEFECTO = {'.html': 'lxml', '.xml': 'lxml', '.md': 'lxml', '.epub': 'lxml'}
+
+# Texto que BeautifulSoup no incluye en get_text en HTML (scripts, estilos, plantillas y ruby)
+_ETIQUETAS_SIN_TEXTO = frozenset({'script', 'style', 'template', 'rt', 'rp'})
+# Caracteres que se acumulan antes de entregar una unidad de texto de marcado
+_CARACTERES_UNIDAD_MARCADO = 64 * 1024
+
+def _motor_marcado(extension, motor=None):
+    motor = motor or MOTOR_MARCADO_POR_DEFECTO.get(extension, 'bs4')
+    if motor not in MOTORES_MARCADO:
+        raise ValueError(f"Motor de extracción '{motor}' no válido (opciones: {', '.join(MOTORES_MARCADO)}).")
+    return motor
+
+def _leer_por_bloques(f, tamano=64 * 1024):
+    while bloque := f.read(tamano):
+        yield bloque
+
+def _unidades_marcado(bloques, html):
+    """Agrupa las cadenas de _textos_marcado en unidades de unos 64K caracteres."""
+    unidad, caracteres, vacio = [], 0, True
+    for texto in _textos_marcado(bloques, html):
+        unidad.append(texto)
+        caracteres += len(texto)
+        if caracteres >= _CARACTERES_UNIDAD_MARCADO:
+            yield "\n".join(unidad)
+            unidad, caracteres, vacio = [], 0, False
+    if unidad or vacio:
+        yield "\n".join(unidad)
+
+def _textos_marcado(bloques, html):
+    """
+    Genera en orden de documento las cadenas de texto (sin espacios en los extremos y no
+    vacías) de un documento HTML o XML recibido por bloques de texto, igual que
+    BeautifulSoup(...).get_text(separator='\\n', strip=True) con el parser de lxml.
+
+    El texto de un elemento solo es definitivo al empezar su primer hijo o al cerrarse, y
+    la cola (tail) de un hijo al empezar el siguiente o al cerrarse el padre, así que se
+    emiten en esos eventos. Los elementos ya recorridos se vacían y se eliminan del
+    árbol, de modo que la memoria no depende del tamaño del documento.
+    """
+    from lxml import etree
+    eventos = ('start', 'end', 'comment', 'pi')
+    if html:
+        parser = etree.HTMLPullParser(events=eventos, recover=True)
+    else:
+        parser = etree.XMLPullParser(events=eventos, recover=True, huge_tree=True)
+    # Cada marco de la pila: [elemento, omitir su texto, último hijo (None = texto propio pendiente)]
+    pila = []
+
+    def pendiente(marco):
+        elemento, omitir, ultimo = marco
+        texto = elemento.text if ultimo is None else ultimo.tail
+        return None if omitir or not texto else texto.strip()
+
+    def procesar(eventos_leidos):
+        for evento, nodo in eventos_leidos:
+            if evento == 'end':
+                texto = pendiente(pila.pop())
+                if texto: yield texto
+                nodo.clear(keep_tail=True)
+                padre = nodo.getparent()
+                if padre is not None:
+                    while nodo.getprevious() is not None:
+                        del padre[0]
+                continue
+            if pila:
+                texto = pendiente(pila[-1])
+                if texto: yield texto
+                pila[-1][2] = nodo
+            if evento == 'start':
+                omitir = (pila[-1][1] if pila else False) or (html and nodo.tag in _ETIQUETAS_SIN_TEXTO)
+                pila.append([nodo, omitir, None])
+
+    for bloque in bloques:
+        parser.feed(bloque)
+        yield from procesar(parser.read_events())
+    try:
+        parser.close()
+    except etree.XMLSyntaxError:
+        pass  # Documento vacío o sin elementos: no hay texto que extraer
+    yield from procesar(parser.read_events())
+
+def _filas_acotadas(filas, max_filas=None, muestreo_filas=None):
+    """Toma una de cada muestreo_filas filas (empezando por la primera) y como mucho max_filas."""
+    if muestreo_filas and muestreo_filas > 1:
+        filas = itertools.islice(filas, 0, None, muestreo_filas)
+    if max_filas is not None:
+        filas = itertools.islice(filas, max_filas)
+    return filas
+
+# --- LECTURA ACOTADA DE TEXTO, MARKDOWN Y JSON ---
+
+# Caracteres leídos de cada vez en TXT, Markdown y JSON: la memoria depende de este
+# tamaño y no del archivo (salvo líneas, secciones o cadenas JSON aún más largas)
+TAMANO_BLOQUE_TEXTO = 1024 * 1024
+# Por debajo de este tamaño el JSON se reformatea con json.loads/json.dumps, más rápido
+UMBRAL_JSON_STREAMING = 32 * 1024 * 1024
+
+def _lineas_por_bloques(bloques):
+    """
+    Reagrupa bloques de texto en unidades cortadas en los saltos de línea (que se
+    descartan), de modo que "\\n".join(unidades) == "".join(bloques).
+    """
+    partes, caracteres = [], 0
+    for bloque in bloques:
+        corte = bloque.rfind('\n')
+        if corte != -1 and caracteres + corte >= TAMANO_BLOQUE_TEXTO // 2:
+            partes.append(bloque[:corte])
+            yield "".join(partes)
+            partes, caracteres = [bloque[corte + 1:]], len(bloque) - corte - 1
+        else:
+            partes.append(bloque)
+            caracteres += len(bloque)
+    yield "".join(partes)
+
+_REFERENCIA_MARKDOWN = re.compile(r' {0,3}\[[^\]]+\]:')
+_INICIO_SECCION_MARKDOWN = re.compile(r'(?:#|[^\W\d_])')
+_ETIQUETA_HTML_MARKDOWN = re.compile(r'<([A-Za-z][\w-]*)')
+_ETIQUETAS_VACIAS = frozenset({'area', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'wbr'})
+
+def _referencias_markdown(f):
+    """Recorre el archivo una vez y devuelve las definiciones de enlaces [id]: url (y rebobina)."""
+    referencias = "".join(linea for linea in f if _REFERENCIA_MARKDOWN.match(linea))
+    f.seek(0)
+    return referencias + "\n" if referencias else ""
+
+def _secciones_markdown(f):
+    """
+    Divide el Markdown en secciones de unos TAMANO_BLOQUE_TEXTO caracteres que se pueden
+    convertir por separado con el mismo resultado: solo se corta tras una línea en
+    blanco y antes de un título o párrafo en la columna 0 (no listas, citas ni código
+    sangrado) y fuera de los bloques HTML. Las definiciones de enlaces de todo el
+    documento se anteponen a cada sección (_referencias_markdown).
+    """
+    seccion, caracteres = [], 0
+    en_blanco = False
+    etiqueta_abierta = None
+    for linea in f:
+        if (en_blanco and caracteres >= TAMANO_BLOQUE_TEXTO and etiqueta_abierta is None
+                and _INICIO_SECCION_MARKDOWN.match(linea)):
+            yield "".join(seccion)
+            seccion, caracteres = [], 0
+        # Cualquier línea que abre una etiqueta cuenta, no solo tras una línea en blanco:
+        # un bloque HTML puede empezar justo después de un separador o de otro bloque
+        if etiqueta_abierta is None and (etiqueta := _ETIQUETA_HTML_MARKDOWN.match(linea)):
+            if etiqueta.group(1).lower() not in _ETIQUETAS_VACIAS:
+                etiqueta_abierta = etiqueta.group(1)
+        if etiqueta_abierta is not None and f"</{etiqueta_abierta}>" in linea:
+            etiqueta_abierta = None
+        seccion.append(linea)
+        caracteres += len(linea)
+        en_blanco = not linea.strip()
+    yield "".join(seccion)
+
+# Tokens JSON (el espacio previo incluido): cadena, número, signo de puntuación o literal
+_TOKEN_JSON = re.compile(r'[ \t\n\r]*(?:("[^"\\]*(?:\\.[^"\\]*)*")|(-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?)'
+                         r'|([{}\[\]:,])|(true|false|null|NaN|Infinity|-Infinity))')
+_CONTROL_JSON = re.compile(r'[\x00-\x1f]')
+
+def _json_con_sangria(bloques):
+    """
+    Genera, a partir del JSON recibido por bloques, el mismo texto que
+    json.dumps(json.loads(texto), indent=2, ensure_ascii=False) sin construir el árbol
+    de objetos: un analizador de tokens con una pila de contenedores abiertos. Valida
+    la sintaxis como json.loads (lanza ValueError); a diferencia de este, conserva las
+    claves repetidas de un objeto en lugar de quedarse con la última.
+    """
+    pila = []                 # '{' o '[' de cada contenedor abierto
+    esperado = 'valor'        # valor | clave | dos_puntos | separador | fin
+    vacio = False             # El contenedor actual acaba de abrirse
+    bloques = iter(bloques)
+    texto, posicion, final = "", 0, False
+    while True:
+        token = _TOKEN_JSON.match(texto, posicion)
+        # Un token al final del texto leído puede continuar en el bloque siguiente
+        if token is None:
+            resto = texto[posicion:posicion + 64].lstrip(' \t\n\r')
+            incompleto = len(texto) - posicion < 64 or resto == "" or resto[0] == '"'
+        else:
+            incompleto = token.end() == len(texto) or (token.group(2) and len(texto) - token.end() < 64)
+        if not final and incompleto:
+            bloque = next(bloques, None)
+            if bloque is None:
+                final = True
+            else:
+                texto, posicion = texto[posicion:] + bloque, 0
+            continue
+        if token is None:
+            if texto[posicion:].strip(' \t\n\r'):
+                raise ValueError(f"JSON no válido cerca de: {texto[posicion:posicion + 40]!r}")
+            if esperado != 'fin':
+                raise ValueError("JSON incompleto: el documento termina antes de tiempo.")
+            return
+        posicion = token.end()
+        cadena, numero, signo, literal = token.groups()
+
+        if esperado == 'separador' and signo == ',':
+            yield ","
+            esperado, vacio = ('clave' if pila[-1] == '{' else 'valor'), False
+            continue
+        if signo in ('}', ']') and pila and signo == ('}' if pila[-1] == '{' else ']') and (
+                esperado == 'separador' or (vacio and esperado in ('clave', 'valor'))):
+            pila.pop()
+            yield signo if esperado != 'separador' else "\n" + "  " * len(pila) + signo
+            esperado = 'separador' if pila else 'fin'
+            continue
+        if esperado == 'dos_puntos' and signo == ':':
+            yield ": "
+            esperado = 'valor'
+            continue
+        if esperado == 'clave' and cadena is not None:
+            yield "\n" + "  " * len(pila)
+            yield _cadena_json(cadena)
+            esperado = 'dos_puntos'
+            continue
+        if esperado != 'valor' or signo in ('}', ']', ':', ','):
+            raise ValueError(f"JSON no válido cerca de: {token.group(0).strip()!r}")
+        if pila and pila[-1] == '[':
+            yield "\n" + "  " * len(pila)
+        if signo:
+            yield signo
+            pila.append(signo)
+            esperado, vacio = ('clave' if signo == '{' else 'valor'), True
+            continue
+        if cadena is not None:
+            yield _cadena_json(cadena)
+        elif numero is not None:
+            es_real = '.' in numero or 'e' in numero or 'E' in numero
+            yield json.dumps(float(numero)) if es_real else str(int(numero))
+        else:
+            yield literal
+        esperado = 'separador' if pila else 'fin'
+
+def _unidades_json(piezas):
+    """Agrupa las piezas de _json_con_sangria en unidades cortadas en un salto de línea."""
+    unidad, caracteres = [], 0
+    for pieza in piezas:
+        if caracteres >= _CARACTERES_UNIDAD_MARCADO and pieza.startswith("\n"):
+            yield "".join(unidad)
+            unidad, caracteres = [pieza[1:]], len(pieza) - 1
+        else:
+            unidad.append(pieza)
+            caracteres += len(pieza)
+    yield "".join(unidad)
+
+def _cadena_json(cadena):
+    # Sin escapes, json.dumps(..., ensure_ascii=False) devuelve la misma cadena
+    if _CONTROL_JSON.search(cadena):
+        raise ValueError("JSON no válido: carácter de control dentro de una cadena.")
+    if '\\' not in cadena:
+        return cadena
+    return json.dumps(json.loads(cadena), ensure_ascii=False)
+
+_registrar_plugins()
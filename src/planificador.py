@@ -0,0 +1,113 @@
+# src/planificador.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .parser_core import PoolProcesos
+
+# Carriles de ejecución, de menor a mayor coste por tarea
+EN_LINEA, HILOS, PROCESOS = "en_linea", "hilos", "procesos"
+CARRILES = (EN_LINEA, HILOS, PROCESOS)
+
+
+class Planificador:
+    """
+    Reparte las tareas en tres carriles según su coste estimado, para que las baratas
+    no esperen detrás de las caras:
+      - en_linea: se ejecutan en el hilo que llama (documentos pequeños y formatos triviales)
+      - hilos: en un pool de hilos (formatos que pasan el tiempo en E/S o en bibliotecas en C)
+      - procesos: en un pool de procesos (extracción que consume CPU en Python y retiene el GIL)
+
+    Cada carril tiene su propio límite de tareas simultáneas; las que lo superan esperan
+    en el hilo que llama, y esa espera cuenta como profundidad de cola. Las funciones del
+    carril de procesos, sus argumentos y su resultado deben poder serializarse con pickle.
+    Los pools se crean la primera vez que se usan; el de procesos es un PoolProcesos,
+    que se sustituye por uno nuevo si un proceso muere.
+    """
+
+    def __init__(self, max_en_linea=4, max_hilos=4, max_procesos=2, segundos_en_linea=0.05,
+                 segundos_procesos=0.5, iniciar_proceso=None, args_iniciar=()):
+        self.segundos_en_linea = segundos_en_linea
+        self.segundos_procesos = segundos_procesos
+        self.limites = {EN_LINEA: max_en_linea, HILOS: max_hilos, PROCESOS: max_procesos}
+        self._semaforos = {carril: threading.BoundedSemaphore(limite) for carril, limite in self.limites.items()}
+        self._en_cola = dict.fromkeys(CARRILES, 0)
+        self._en_curso = dict.fromkeys(CARRILES, 0)
+        self._hilos = None
+        self._procesos = PoolProcesos(max_procesos, iniciar_proceso, args_iniciar)
+        self._metricas = None
+        self._lock = threading.Lock()
+
+    # --- API pública ---
+
+    def elegir_carril(self, segundos, cpu=False) -> str:
+        """
+        Carril para una tarea de coste estimado `segundos` (None si no se conoce). Solo
+        las que consumen CPU (cpu=True) y superan segundos_procesos van a otro proceso.
+        """
+        if segundos is not None and segundos <= self.segundos_en_linea:
+            return EN_LINEA
+        if cpu and (segundos is None or segundos >= self.segundos_procesos):
+            return PROCESOS
+        return HILOS
+
+    def ejecutar(self, carril, funcion, *args, **kwargs):
+        """Ejecuta funcion(*args, **kwargs) en el carril indicado y devuelve su resultado."""
+        entrada = time.perf_counter()
+        self._contar(self._en_cola, carril, 1)
+        try:
+            self._semaforos[carril].acquire()
+        finally:
+            self._contar(self._en_cola, carril, -1)
+        self._contar(self._en_curso, carril, 1)
+        try:
+            if self._metricas is not None:
+                self._metricas.observar(f"espera_{carril}", time.perf_counter() - entrada)
+                self._metricas.contar("planificador_tareas", carril=carril)
+            if carril == EN_LINEA:
+                return funcion(*args, **kwargs)
+            if carril == HILOS:
+                return self._pool_hilos().submit(funcion, *args, **kwargs).result()
+            with self._procesos.usar() as pool:
+                return pool.submit(funcion, *args, **kwargs).result()
+        finally:
+            self._contar(self._en_curso, carril, -1)
+            self._semaforos[carril].release()
+
+    def estadisticas(self) -> dict:
+        """Tareas en cola y en curso de cada carril."""
+        with self._lock:
+            return {carril: {"en_cola": self._en_cola[carril], "en_curso": self._en_curso[carril],
+                             "limite": self.limites[carril]} for carril in CARRILES}
+
+    def registrar_metricas(self, metricas):
+        """
+        Añade al RegistroMetricas la profundidad de cola y las tareas en curso de cada
+        carril (indicadores), el tiempo de espera (etapa espera_<carril>) y un contador
+        de tareas por carril.
+        """
+        self._metricas = metricas
+        for carril in CARRILES:
+            metricas.registrar_indicador(f"planificador_{carril}_en_cola", f"Tareas esperando en el carril {carril}",
+                                         lambda c=carril: self.estadisticas()[c]["en_cola"])
+            metricas.registrar_indicador(f"planificador_{carril}_en_curso", f"Tareas ejecutándose en el carril {carril}",
+                                         lambda c=carril: self.estadisticas()[c]["en_curso"])
+
+    def cerrar(self, esperar=True):
+        with self._lock:
+            hilos, self._hilos = self._hilos, None
+        if hilos is not None:
+            hilos.shutdown(wait=esperar, cancel_futures=not esperar)
+        self._procesos.cerrar(esperar)
+
+    # --- Internos ---
+
+    def _contar(self, contadores, carril, incremento):
+        with self._lock:
+            contadores[carril] += incremento
+
+    def _pool_hilos(self):
+        with self._lock:
+            if self._hilos is None:
+                self._hilos = ThreadPoolExecutor(max_workers=self.limites[HILOS], thread_name_prefix="planificador")
+            return self._hilos
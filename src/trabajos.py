@@ -0,0 +1,195 @@
+# src/trabajos.py
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Estados posibles de un trabajo
+PENDIENTE, EN_CURSO, COMPLETADO, ERROR, CANCELADO = "pendiente", "en_curso", "completado", "error", "cancelado"
+TERMINADOS = (COMPLETADO, ERROR, CANCELADO)
+_ID_VALIDO = re.compile(r'[0-9a-f]{32}')
+
+
+class GestorTrabajos:
+    """
+    Ejecuta trabajos largos en un pool de hilos local y guarda su estado, progreso y
+    resultado para consultarlos más tarde. La función de cada trabajo recibe un
+    progress_callback con el que informa del avance (0-100) y un threading.Event
+    cancelacion que se activa al cancelar el trabajo y que debe consultar.
+
+    Si se indica un directorio, el estado y el resultado también se escriben en disco,
+    de modo que cualquier worker de la API que comparta ese directorio puede responder
+    a las consultas. Los trabajos terminados se eliminan al superar ttl_segundos.
+    """
+
+    def __init__(self, max_hilos=2, ttl_segundos=3600, directorio=None):
+        self.ttl_segundos = ttl_segundos
+        self.directorio = Path(directorio) if directorio else None
+        if self.directorio:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="trabajo")
+        self._trabajos = {}
+        self._resultados = {}
+        self._progreso_persistido = {}
+        self._cancelaciones = {}
+        self._liberar = {}
+        self._lock = threading.Lock()
+
+    # --- API pública ---
+
+    def enviar(self, funcion, *args, metadatos=None, liberar=None, **kwargs) -> str:
+        """
+        Encola funcion(*args, progress_callback=..., cancelacion=..., **kwargs) y devuelve el id
+        del trabajo. Si se cancela antes de empezar, funcion no llega a ejecutarse y en su lugar
+        se llama a liberar() (p. ej. para cerrar el archivo de entrada que funcion cerraría).
+        """
+        self.limpiar_caducados()
+        id_trabajo = uuid.uuid4().hex
+        ahora = time.time()
+        trabajo = {"id": id_trabajo, "estado": PENDIENTE, "progreso": 0, "error": None,
+                   "creado": ahora, "actualizado": ahora, **(metadatos or {})}
+        with self._lock:
+            self._trabajos[id_trabajo] = trabajo
+            self._cancelaciones[id_trabajo] = threading.Event()
+            if liberar is not None:
+                self._liberar[id_trabajo] = liberar
+        self._persistir_estado(trabajo)
+        self._pool.submit(self._ejecutar, id_trabajo, funcion, args, kwargs)
+        return id_trabajo
+
+    def estado(self, id_trabajo: str):
+        """Devuelve una copia del estado del trabajo o None si no existe (o ya caducó)."""
+        self.limpiar_caducados()
+        with self._lock:
+            trabajo = self._trabajos.get(id_trabajo)
+            if trabajo is not None:
+                return dict(trabajo)
+        return self._leer_estado_disco(id_trabajo)
+
+    def resultado(self, id_trabajo: str):
+        """Devuelve el resultado de un trabajo completado o None si no está disponible."""
+        with self._lock:
+            if id_trabajo in self._resultados:
+                return self._resultados[id_trabajo]
+        ruta = self._ruta(id_trabajo, ".txt")
+        if ruta is not None and ruta.exists():
+            return ruta.read_text(encoding='utf-8')
+        return None
+
+    def cancelar(self, id_trabajo: str) -> bool:
+        """
+        Pide la cancelación de un trabajo pendiente o en curso de este proceso. Devuelve
+        False si no existe aquí o ya ha terminado.
+        """
+        with self._lock:
+            trabajo = self._trabajos.get(id_trabajo)
+            if trabajo is None or trabajo["estado"] in TERMINADOS:
+                return False
+            self._cancelaciones[id_trabajo].set()
+            pendiente = trabajo["estado"] == PENDIENTE
+            liberar = self._liberar.pop(id_trabajo, None) if pendiente else None
+        if pendiente:
+            self._actualizar(id_trabajo, estado=CANCELADO)
+        if liberar is not None:
+            liberar()
+        return True
+
+    def limpiar_caducados(self):
+        """Elimina los trabajos terminados hace más de ttl_segundos (en memoria y en disco)."""
+        limite = time.time() - self.ttl_segundos
+        with self._lock:
+            caducados = [i for i, t in self._trabajos.items()
+                         if t["estado"] in TERMINADOS and t["actualizado"] < limite]
+            for id_trabajo in caducados:
+                del self._trabajos[id_trabajo]
+                self._resultados.pop(id_trabajo, None)
+                self._progreso_persistido.pop(id_trabajo, None)
+                self._cancelaciones.pop(id_trabajo, None)
+                self._liberar.pop(id_trabajo, None)
+        if self.directorio:
+            for ruta in self.directorio.glob("*.json"):
+                try:
+                    if ruta.stat().st_mtime < limite and self._leer_estado_disco(ruta.stem)["estado"] in TERMINADOS:
+                        ruta.unlink(missing_ok=True)
+                        ruta.with_suffix(".txt").unlink(missing_ok=True)
+                except (OSError, TypeError, KeyError):
+                    continue
+
+    def cerrar(self, esperar=True):
+        self._pool.shutdown(wait=esperar, cancel_futures=not esperar)
+
+    # --- Ejecución ---
+
+    def _ejecutar(self, id_trabajo, funcion, args, kwargs):
+        with self._lock:
+            cancelacion = self._cancelaciones.get(id_trabajo)
+            # A partir de aquí la entrada es responsabilidad de funcion (o se libera ahora)
+            liberar = self._liberar.pop(id_trabajo, None)
+            cancelado = cancelacion is None or cancelacion.is_set()
+        if cancelado:
+            if liberar is not None:
+                liberar()  # Cancelado antes de empezar
+            return
+        self._actualizar(id_trabajo, estado=EN_CURSO)
+        try:
+            resultado = funcion(*args, progress_callback=lambda p: self._progreso(id_trabajo, p),
+                                cancelacion=cancelacion, **kwargs)
+        except Exception as e:
+            self._actualizar(id_trabajo, estado=CANCELADO if cancelacion.is_set() else ERROR, error=str(e))
+            return
+        with self._lock:
+            self._resultados[id_trabajo] = resultado
+        ruta = self._ruta(id_trabajo, ".txt")
+        if ruta is not None:
+            ruta.write_text(resultado, encoding='utf-8')
+        self._actualizar(id_trabajo, estado=COMPLETADO, progreso=100)
+
+    def _progreso(self, id_trabajo, progreso):
+        with self._lock:
+            trabajo = self._trabajos.get(id_trabajo)
+            if trabajo is None:
+                return
+            trabajo["progreso"] = progreso
+            # En disco solo se refleja cada 5 % para no escribir en cada página
+            if progreso - self._progreso_persistido.get(id_trabajo, 0) < 5 and progreso != 100:
+                return
+            self._progreso_persistido[id_trabajo] = progreso
+        self._actualizar(id_trabajo)
+
+    def _actualizar(self, id_trabajo, **cambios):
+        with self._lock:
+            trabajo = self._trabajos.get(id_trabajo)
+            if trabajo is None:
+                return
+            trabajo.update(cambios)
+            trabajo["actualizado"] = time.time()
+            copia = dict(trabajo)
+        self._persistir_estado(copia)
+
+    # --- Persistencia en disco ---
+
+    def _ruta(self, id_trabajo, sufijo):
+        if not self.directorio or not _ID_VALIDO.fullmatch(id_trabajo):
+            return None
+        return self.directorio / f"{id_trabajo}{sufijo}"
+
+    def _persistir_estado(self, trabajo):
+        ruta = self._ruta(trabajo["id"], ".json")
+        if ruta is None:
+            return
+        temporal = ruta.with_suffix(f".{threading.get_ident()}.tmp")
+        temporal.write_text(json.dumps(trabajo, ensure_ascii=False), encoding='utf-8')
+        os.replace(temporal, ruta)
+
+    def _leer_estado_disco(self, id_trabajo):
+        ruta = self._ruta(id_trabajo, ".json")
+        if ruta is None:
+            return None
+        try:
+            return json.loads(ruta.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None